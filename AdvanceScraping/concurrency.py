@@ -0,0 +1,148 @@
+import os
+import statistics
+import threading
+import time
+
+# Answers that mean "slow down"; other 5xx and 4xx are about the request, not the load
+OVERLOAD_STATUSES = frozenset({429, 503})
+
+def load_per_cpu():
+    """1-minute load average divided by CPU count, or None where the OS has no load average."""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class AdaptiveConcurrency:
+    """AIMD controller for the number of downloads in flight.
+
+    Every `interval` seconds it looks at what happened since the last check:
+    DOIs finished per second, the median latency of individual HTTP requests
+    (a whole DOI's time depends on how many sources it needed, not on load),
+    the share of requests that were overload answers (429, 503, timeouts) and
+    the CPU load. Refused connections and DNS failures are not counted; they
+    mean a host is unreachable from here, not that we are pushing too hard.
+    If errors or latency say the link or the hosts are overloaded, the limit
+    is cut multiplicatively. Otherwise, while the limit was actually reached,
+    requests/s did not drop and the CPU has headroom, it grows by
+    `increase`. The limit starts at `initial` and stays within
+    [min_limit, max_limit].
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64, interval: float = 10.0,
+                 increase: int = 1, decrease: float = 0.7, max_error_rate: float = 0.1,
+                 latency_tolerance: float = 2.0, max_load: float = 1.5, min_samples: int = 5, logger=None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(initial, self.min_limit), self.max_limit)
+        self.interval = interval
+        self.increase = increase
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.latency_tolerance = latency_tolerance
+        self.max_load = max_load
+        self.min_samples = min_samples
+        self.logger = logger
+        self.in_flight = 0
+        self.best_latency = None
+        self.history = []
+        self._prev_request_rate = None
+        self._grew = False
+        self._lock = threading.Lock()
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._completed = 0
+        self._peak = self.in_flight
+        with self._lock:
+            self._request_latencies = []
+            self._responses = 0
+            self._errors = 0
+
+    def observe_request(self, seconds: float, status_code: int = None, timed_out: bool = False):
+        """Called by workers for every HTTP request that got an answer or timed out."""
+        error = timed_out or status_code in OVERLOAD_STATUSES
+        with self._lock:
+            self._request_latencies.append(seconds)
+            self._responses += 1
+            self._errors += error
+
+    def task_started(self):
+        self.in_flight += 1
+        self._peak = max(self._peak, self.in_flight)
+
+    def task_done(self, latency: float):
+        self.in_flight -= 1
+        self._completed += 1
+        elapsed = time.monotonic() - self._window_start
+        if elapsed >= self.interval and self._completed >= self.min_samples:
+            self._adjust(elapsed)
+
+    def _adjust(self, elapsed: float):
+        with self._lock:
+            responses, errors = self._responses, self._errors
+            latencies = self._request_latencies
+        throughput = self._completed / elapsed
+        request_rate = responses / elapsed
+        if not latencies:
+            # Everything came from the page cache or failed before a request; no latency signal
+            latency = self.best_latency or 0.0
+        else:
+            latency = statistics.median(latencies)
+        error_rate = errors / responses if responses else 0.0
+        load = load_per_cpu()
+        saturated = self._peak >= self.limit
+
+        # Baseline for the latency signal; it drifts up slowly so one lucky window cannot pin the limit down
+        if not self.best_latency:
+            self.best_latency = latency
+        else:
+            self.best_latency = min(latency, self.best_latency * 1.05)
+
+        old = self.limit
+        if error_rate > self.max_error_rate:
+            reason = f"error rate {error_rate:.0%}"
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+        elif latency > self.best_latency * self.latency_tolerance:
+            reason = f"latency {latency:.1f}s vs best {self.best_latency:.1f}s"
+            self.limit = max(self.min_limit, int(self.limit * self.decrease))
+        elif self._grew and request_rate < self._prev_request_rate * 0.9:
+            # The last increase cost throughput with no overload signal (e.g. bandwidth saturated): undo it.
+            # Requests/s, not DOIs/s: the DOI mix changes over a run (fast paths are scheduled first)
+            reason = f"request rate fell to {request_rate:.2f}/s"
+            self.limit = max(self.min_limit, self.limit - self.increase)
+        elif load is not None and load > self.max_load:
+            # Load average is machine-wide and lags; it can hold growth back but is no reason to cut
+            reason = f"CPU load {load:.2f} per core"
+        elif saturated:
+            reason = "no congestion"
+            self.limit = min(self.max_limit, self.limit + self.increase)
+        else:
+            reason = "limit not reached"
+
+        self._grew = self.limit > old
+        self.history.append((time.time(), self.limit, throughput, latency, error_rate))
+        if self.logger is not None and self.limit != old:
+            self.logger.info(f"Concurrency {old} -> {self.limit} ({reason}; {throughput:.2f} DOIs/s, "
+                             f"median {latency:.1f}s, errors {error_rate:.0%})")
+        self._prev_request_rate = request_rate
+        self._reset_window()
+
+
+class FixedConcurrency:
+    """Constant limit with the AdaptiveConcurrency interface, for --fixed-workers."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def observe_request(self, seconds: float, status_code: int = None, timed_out: bool = False):
+        pass
+
+    def task_started(self):
+        self.in_flight += 1
+
+    def task_done(self, latency: float):
+        self.in_flight -= 1
@@ -0,0 +1,323 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from rate_limit import HostRateLimiter
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Coordinator(ABC):
+    """Shared state for several downloader instances working through the same DOI list.
+
+    Every instance walks its own copy of the input and claims a DOI before
+    downloading it. A claim is a lease that expires unless heartbeat() renews
+    it, so work held by a crashed instance is picked up by the others. The same
+    backend holds a global per-host request budget and a cache of DOI -> PDF URL
+    resolutions.
+    """
+
+    @abstractmethod
+    def claim(self, doi: str, worker_id: str, lease_seconds: float) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, dois, worker_id: str, lease_seconds: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, doi: str, worker_id: str, status: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def status(self, doi: str):
+        """Final status recorded by whichever instance completed doi, or None while it is open."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def reserve_host_slot(self, host: str, interval: float) -> float:
+        """Book the next request slot for host; returns how long the caller must sleep first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_resolved(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_resolved(self, key: str, url: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def forget_resolved(self, key: str):
+        raise NotImplementedError
+
+
+class SQLiteCoordinator(Coordinator):
+    """Coordinator on a single SQLite file, serialised with BEGIN IMMEDIATE.
+
+    Good for several processes on one machine, or machines sharing a
+    filesystem with working POSIX locks. Clocks are wall time, so nodes
+    sharing a file need reasonably synced clocks.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = os.path.expanduser(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS work (
+                    doi TEXT PRIMARY KEY, owner TEXT, lease_expires REAL, status TEXT, updated REAL);
+                CREATE TABLE IF NOT EXISTS host_budget (host TEXT PRIMARY KEY, next_slot REAL);
+                CREATE TABLE IF NOT EXISTS resolved (key TEXT PRIMARY KEY, url TEXT, updated REAL);
+            """)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self, fn):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(db)
+            db.execute("COMMIT")
+            return result
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def claim(self, doi, worker_id, lease_seconds):
+        def txn(db):
+            now = time.time()
+            row = db.execute("SELECT owner, lease_expires, status FROM work WHERE doi = ?", (doi,)).fetchone()
+            if row is not None:
+                owner, expires, status = row
+                if status is not None:
+                    return False
+                if owner != worker_id and expires > now:
+                    return False
+            db.execute("INSERT OR REPLACE INTO work VALUES (?, ?, ?, NULL, ?)",
+                       (doi, worker_id, now + lease_seconds, now))
+            return True
+        return self._transaction(txn)
+
+    def heartbeat(self, dois, worker_id, lease_seconds):
+        dois = list(dois)
+        if not dois:
+            return
+        expires = time.time() + lease_seconds
+        self._transaction(lambda db: db.executemany(
+            "UPDATE work SET lease_expires = ? WHERE doi = ? AND owner = ? AND status IS NULL",
+            [(expires, doi, worker_id) for doi in dois]))
+
+    def complete(self, doi, worker_id, status):
+        self._transaction(lambda db: db.execute(
+            "UPDATE work SET status = ?, updated = ? WHERE doi = ? AND owner = ?",
+            (status, time.time(), doi, worker_id)))
+
+    def status(self, doi):
+        row = self._connect().execute("SELECT status FROM work WHERE doi = ?", (doi,)).fetchone()
+        return row[0] if row else None
+
+    def reserve_host_slot(self, host, interval):
+        def txn(db):
+            now = time.time()
+            row = db.execute("SELECT next_slot FROM host_budget WHERE host = ?", (host,)).fetchone()
+            slot = max(now, row[0] if row else 0.0)
+            db.execute("INSERT OR REPLACE INTO host_budget VALUES (?, ?)", (host, slot + interval))
+            return slot - now
+        return self._transaction(txn)
+
+    def get_resolved(self, key):
+        row = self._connect().execute("SELECT url FROM resolved WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_resolved(self, key, url):
+        self._transaction(lambda db: db.execute(
+            "INSERT OR REPLACE INTO resolved VALUES (?, ?, ?)", (key, url, time.time())))
+
+    def forget_resolved(self, key):
+        self._transaction(lambda db: db.execute("DELETE FROM resolved WHERE key = ?", (key,)))
+
+
+class KeyValueStore(ABC):
+    """The handful of atomic operations StoreCoordinator needs from a network store.
+
+    A Redis/etcd/Consul adapter maps these onto SET NX PX, GET, DEL and a
+    compare-and-set; DictStore implements them in-process for local runs and tests.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key, value, ttl: float = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_if_absent(self, key, value, ttl: float = None) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def compare_and_set(self, key, expected, value, ttl: float = None) -> bool:
+        raise NotImplementedError
+
+
+class DictStore(KeyValueStore):
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def set_if_absent(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        with self._lock:
+            item = self._live(key)
+            if (item[0] if item else None) != expected:
+                return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+
+class StoreCoordinator(Coordinator):
+    """Coordinator over any KeyValueStore, for instances on different machines."""
+
+    def __init__(self, store: KeyValueStore, namespace: str = 'doi'):
+        self.store = store
+        self.ns = namespace
+
+    def claim(self, doi, worker_id, lease_seconds):
+        if self.store.get(f"{self.ns}:done:{doi}") is not None:
+            return False
+        if self.store.set_if_absent(f"{self.ns}:lease:{doi}", worker_id, ttl=lease_seconds):
+            return True
+        # Re-claiming our own lease (e.g. a validation retry) just extends it
+        return self.store.compare_and_set(f"{self.ns}:lease:{doi}", worker_id, worker_id, ttl=lease_seconds)
+
+    def heartbeat(self, dois, worker_id, lease_seconds):
+        for doi in dois:
+            self.store.compare_and_set(f"{self.ns}:lease:{doi}", worker_id, worker_id, ttl=lease_seconds)
+
+    def complete(self, doi, worker_id, status):
+        self.store.set(f"{self.ns}:done:{doi}", status)
+
+    def status(self, doi):
+        return self.store.get(f"{self.ns}:done:{doi}")
+
+    def reserve_host_slot(self, host, interval):
+        key = f"{self.ns}:host:{host}"
+        while True:
+            now = time.time()
+            current = self.store.get(key)
+            slot = max(now, float(current) if current is not None else 0.0)
+            if self.store.compare_and_set(key, current, repr(slot + interval)):
+                return slot - now
+
+    def get_resolved(self, key):
+        return self.store.get(f"{self.ns}:resolved:{key}")
+
+    def put_resolved(self, key, url):
+        self.store.set(f"{self.ns}:resolved:{key}", url)
+
+    def forget_resolved(self, key):
+        self.store.delete(f"{self.ns}:resolved:{key}")
+
+
+class GlobalHostRateLimiter(HostRateLimiter):
+    """Drop-in for HostRateLimiter that shares each host's budget across all instances."""
+
+    def __init__(self, coordinator: Coordinator, rate: float = 1.0):
+        super().__init__(rate)
+        self.coordinator = coordinator
+
+    def _reserve(self, host):
+        return self.coordinator.reserve_host_slot(host, self.interval)
+
+
+class LeaseKeeper:
+    """Background heartbeat for the DOIs this instance currently holds."""
+
+    def __init__(self, coordinator: Coordinator, worker_id: str, lease_seconds: float = 300.0):
+        self.coordinator = coordinator
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='lease-keeper', daemon=True)
+
+    def claim(self, doi: str) -> bool:
+        if not self.coordinator.claim(doi, self.worker_id, self.lease_seconds):
+            return False
+        with self._lock:
+            self._held.add(doi)
+        return True
+
+    def complete(self, doi: str, status: str):
+        self.coordinator.complete(doi, self.worker_id, status)
+        with self._lock:
+            self._held.discard(doi)
+
+    def release(self, doi: str):
+        """Stop renewing doi without completing it; another instance takes over once the lease runs out."""
+        with self._lock:
+            self._held.discard(doi)
+
+    def held(self) -> set:
+        with self._lock:
+            return set(self._held)
+
+    def _loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held)
+            self.coordinator.heartbeat(held, self.worker_id, self.lease_seconds)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,265 @@
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from doi_metadata import doi_key, normalize_doi
+from results_sink import load_results
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+-- AUTOINCREMENT: a rewritten file must never get an id an old fulltext row still points at
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT UNIQUE,
+    sha256 TEXT,
+    size INTEGER,
+    mtime REAL,
+    doi TEXT,
+    pages INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_sha256 ON documents(sha256);
+CREATE INDEX IF NOT EXISTS documents_doi ON documents(doi);
+CREATE TABLE IF NOT EXISTS metadata (
+    doi TEXT PRIMARY KEY,
+    pmid TEXT,
+    title TEXT,
+    authors TEXT,
+    journal TEXT,
+    pub_date TEXT,
+    citations INTEGER
+);
+-- Contentless: only the inverted index is stored, not a second copy of every paper's text
+CREATE VIRTUAL TABLE IF NOT EXISTS fulltext USING fts5(body, content='', tokenize='porter unicode61');
+"""
+
+
+def extract_pdf_text(path: str):
+    """Hash and extract one PDF. Runs in a worker process; returns (path, sha256, pages, text, error)."""
+    try:
+        data = Path(path).read_bytes()
+    except OSError as e:
+        return path, None, None, '', str(e)
+    digest = hashlib.sha256(data).hexdigest()
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return path, digest, None, '', 'pypdf is not installed'
+    try:
+        import io
+        reader = PdfReader(io.BytesIO(data))
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+        return path, digest, len(reader.pages), text, None
+    except Exception as e:
+        return path, digest, None, '', f'extract failed: {e}'
+
+
+class CorpusIndex:
+    """SQLite FTS5 index over the downloaded PDFs, joined to the PubMed metadata CSV by DOI."""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path).expanduser()
+        self.db = sqlite3.connect(str(self.db_path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._drop_reusable_ids()
+        self.db.executescript(SCHEMA)
+
+    def _drop_reusable_ids(self):
+        # Indexes built before AUTOINCREMENT may already have stale fulltext rows matching reused
+        # ids, and there is no telling which; the index is derived data, so rebuild it from the files
+        row = self.db.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'documents'").fetchone()
+        if row is not None and 'AUTOINCREMENT' not in row[0].upper():
+            logger.warning(f"Rebuilding {self.db_path}: documents table predates AUTOINCREMENT ids")
+            self.db.executescript("DROP TABLE documents; DROP TABLE IF EXISTS fulltext;")
+
+    def load_metadata(self, csv_file: str) -> int:
+        """Load the scraping.py output (PMID, DOI, Title, Authors, Journal, ...) into the metadata table."""
+        rows = []
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                doi = doi_key(normalize_doi(row.get('DOI') or row.get('doi') or ''))
+                if not doi:
+                    continue
+                citations = row.get('Citations Count') or None
+                rows.append((doi, row.get('PMID'), row.get('Title'), row.get('Authors'), row.get('Journal'),
+                             row.get('Publication Date'), int(float(citations)) if citations else None))
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        logger.info(f"Loaded metadata for {len(rows)} DOIs from {csv_file}")
+        return len(rows)
+
+    def _known_files(self) -> dict:
+        # Files that failed to extract are not known: the next run tries them again
+        return {path: (size, mtime) for path, size, mtime in
+                self.db.execute("SELECT path, size, mtime FROM documents WHERE error IS NULL")}
+
+    def _known_hashes(self) -> set:
+        # Hashes whose text is in the index; failed extractions and orphaned duplicates do not count
+        return {row[0] for row in self.db.execute(
+            "SELECT sha256 FROM documents d WHERE EXISTS (SELECT 1 FROM fulltext WHERE rowid = d.id)")}
+
+    def _delete_document(self, doc_id: int, digest: str):
+        """Delete one documents row. If it held the text for its hash, returns the duplicates left without it.
+
+        Only the first file with a given hash gets fulltext. When that file goes,
+        its duplicates lose their size and mtime, so they read as changed and are
+        extracted again, now or on the next run; the first of them takes over the text.
+        """
+        owned = self.db.execute("SELECT 1 FROM fulltext WHERE rowid = ?", (doc_id,)).fetchone()
+        self.db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        if not owned:
+            return None
+        self.db.execute("UPDATE documents SET size = NULL, mtime = NULL WHERE sha256 = ?", (digest,))
+        return [row[0] for row in self.db.execute("SELECT path FROM documents WHERE sha256 = ?", (digest,))]
+
+    def index_directory(self, output_dir: str, doi_by_filename: dict = None, workers: int = None) -> dict:
+        """Extract and index every PDF under output_dir that is new or changed since the last run."""
+        output_dir = Path(output_dir).expanduser()
+        doi_by_filename = doi_by_filename or {}
+        known_files = self._known_files()
+
+        todo = {}
+        seen = {}
+        for path in output_dir.rglob('*.pdf'):
+            st = path.stat()
+            seen[str(path)] = (st.st_size, st.st_mtime)
+            # Unchanged size+mtime means we have already hashed this exact file
+            if known_files.get(str(path)) != seen[str(path)]:
+                todo[str(path)] = seen[str(path)]
+        unchanged = len(seen) - len(todo)
+
+        # Files deleted since the last run; their fulltext rows stop joining once the documents row goes
+        gone = [path for path in self.db.execute("SELECT path FROM documents").fetchall()
+                if path[0] not in seen and path[0].startswith(str(output_dir))]
+        with self.db:
+            for (path,) in gone:
+                doc_id, digest = self.db.execute("SELECT id, sha256 FROM documents WHERE path = ?", (path,)).fetchone()
+                for duplicate in self._delete_document(doc_id, digest) or []:
+                    if duplicate in seen and duplicate not in todo:
+                        todo[duplicate] = seen[duplicate]
+                        unchanged -= 1
+        known_hashes = self._known_hashes()
+
+        counts = {'indexed': 0, 'duplicate': 0, 'errors': 0, 'unchanged': unchanged, 'removed': len(gone)}
+        if not todo:
+            return counts
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # A rewritten file can leave its duplicates without text; they go round again
+            queued = set(todo)
+            while todo:
+                futures = {executor.submit(extract_pdf_text, path): (path, size, mtime)
+                           for path, (size, mtime) in todo.items()}
+                todo = {}
+                for future in as_completed(futures):
+                    path, size, mtime = futures.pop(future)
+                    for duplicate in self._index_file(path, size, mtime, future.result(), doi_by_filename,
+                                                      known_hashes, counts):
+                        if duplicate in seen and duplicate != path:
+                            todo[duplicate] = seen[duplicate]
+                            if duplicate not in queued:
+                                queued.add(duplicate)
+                                counts['unchanged'] -= 1
+        logger.info(f"Indexed corpus under {output_dir}: {counts}")
+        return counts
+
+    def _index_file(self, path: str, size: int, mtime: float, extracted: tuple, doi_by_filename: dict,
+                    known_hashes: set, counts: dict) -> list:
+        """Store one extraction result; returns duplicates that lost their text row on the way."""
+        _, digest, pages, text, error = extracted
+        doi = doi_by_filename.get(Path(path).name)
+        doi = doi_key(normalize_doi(doi)) if doi else None
+        orphaned = []
+        with self.db:
+            old = self.db.execute("SELECT id, sha256 FROM documents WHERE path = ?", (path,)).fetchone()
+            if old:
+                # Contentless FTS rows cannot be deleted without the old text; ids are
+                # never reused, so the stale rowid no longer joins and drops out of search()
+                orphaned = self._delete_document(*old)
+                if orphaned is not None:
+                    known_hashes.discard(old[1])
+            cur = self.db.execute(
+                "INSERT INTO documents (path, sha256, size, mtime, doi, pages, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, digest, size, mtime, doi, pages, error))
+            if error:
+                counts['errors'] += 1
+            elif digest in known_hashes:
+                # Same bytes under another name (e.g. a re-download); keep the row, skip the text
+                counts['duplicate'] += 1
+            else:
+                self.db.execute("INSERT INTO fulltext (rowid, body) VALUES (?, ?)", (cur.lastrowid, text))
+                known_hashes.add(digest)
+                counts['indexed'] += 1
+        return orphaned or []
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """FTS5 query (e.g. 'gel OR gelation OR "gel hardness"'), best bm25 matches first."""
+        sql = """
+            SELECT d.path, d.doi, m.title, m.journal, m.pub_date, bm25(fulltext) AS score
+            FROM fulltext
+            JOIN documents d ON d.id = fulltext.rowid
+            LEFT JOIN metadata m ON m.doi = d.doi
+            WHERE fulltext MATCH ?
+            ORDER BY score
+            LIMIT ?
+        """
+        columns = ('path', 'doi', 'title', 'journal', 'pub_date', 'score')
+        return [dict(zip(columns, row)) for row in self.db.execute(sql, (query, limit))]
+
+    def close(self):
+        self.db.close()
+
+
+def keywords_query(keywords: list) -> str:
+    """['Gel', 'Gel Hardness'] -> '"Gel" OR "Gel Hardness"' (phrases kept together)."""
+    return ' OR '.join('"' + kw.replace('"', '""') + '"' for kw in keywords)
+
+
+def doi_map_from_results(output_dir: Path) -> dict:
+    # filename may be a sharded relative path (ab/cd/x.pdf); the index looks files up by name
+    return {Path(row['filename']).name: row['doi'] for row in load_results(output_dir) if row.get('filename')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Full-text index of the downloaded paper corpus")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    idx = sub.add_parser('index', help="extract and index new or changed PDFs")
+    idx.add_argument('output_dir')
+    idx.add_argument('--db', default=None, help="index file (default: <output_dir>/corpus_index.sqlite3)")
+    idx.add_argument('--metadata', help="PubMed metadata CSV from scraping.py")
+    idx.add_argument('--workers', type=int, default=os.cpu_count())
+
+    search = sub.add_parser('search', help="keyword search over the index")
+    search.add_argument('db')
+    search.add_argument('keywords', nargs='+')
+    search.add_argument('--limit', type=int, default=50)
+    search.add_argument('--raw', action='store_true', help="pass the keywords through as an FTS5 query")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'index':
+        output_dir = Path(args.output_dir).expanduser()
+        index = CorpusIndex(args.db or output_dir / 'corpus_index.sqlite3')
+        if args.metadata:
+            index.load_metadata(args.metadata)
+        index.index_directory(output_dir, doi_map_from_results(output_dir), workers=args.workers)
+        index.close()
+    else:
+        index = CorpusIndex(args.db)
+        query = ' '.join(args.keywords) if args.raw else keywords_query(args.keywords)
+        for hit in index.search(query, args.limit):
+            print(f"{hit['score']:.2f}\t{hit['doi'] or '-'}\t{hit['title'] or Path(hit['path']).name}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
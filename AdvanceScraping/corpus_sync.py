@@ -0,0 +1,202 @@
+"""Bring an output directory in line with the current DOI set, downloading only the difference.
+
+    python corpus_sync.py PubMed_Gelation_FullData_2015_2025.csv pubmed_doi.csv -o ~/papers --remove-orphans
+
+Every source's DOI column is unioned into the wanted set. The corpus side
+comes from a scan of output_dir, with DOIs for each file taken from
+corpus_manifest.json (for files whose size and mtime have not changed), then
+the download_results file, then the downloaders' filename scheme. Wanted DOIs
+without a file are handed to download_papers.main with the same output_dir;
+any other options on the command line are passed through to it.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+from doi_input import load_doi_list
+from doi_metadata import doi_key, normalize_doi
+from results_sink import load_results
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'corpus_manifest.json'
+DOI_SHAPE = re.compile(r'^10\.\d{4,9}/\S+$')
+# version 4 names files <doi>_<YYYYmmddHHMMSS>.pdf; the HTML fallback adds _htmlfallback
+FILENAME_SUFFIX = re.compile(r'(_\d{14}|_htmlfallback)?\.pdf$', re.IGNORECASE)
+
+
+def safe_filename(doi: str) -> str:
+    """Same mangling the downloaders use for file names."""
+    return re.sub(r'[^\w\-_\.]', '_', doi)
+
+
+def scan_pdfs(root: Path) -> dict:
+    """relative path -> (size, mtime) for every PDF under root, using scandir's cached stat."""
+    found = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            logger.warning(f"Cannot scan {directory}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith('.'):
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith('.pdf'):
+                    st = entry.stat(follow_symlinks=False)
+                    found[Path(entry.path).relative_to(root).as_posix()] = (st.st_size, st.st_mtime)
+    return found
+
+
+class CorpusManifest:
+    """relative path -> (size, mtime, doi) for every PDF in output_dir, kept between syncs."""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir).expanduser()
+        self.path = self.output_dir / MANIFEST_NAME
+        self.files = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                self.files = {rel: tuple(entry) for rel, entry in json.load(f)['files'].items()}
+
+    def refresh(self, wanted_by_filename: dict = None) -> dict:
+        """Rescan output_dir and attach a DOI to each file; returns doi key -> relative path."""
+        wanted_by_filename = wanted_by_filename or {}
+        from_results = {Path(row['filename']).name: row['doi']
+                        for row in load_results(self.output_dir) if row.get('filename')}
+
+        files = {}
+        for rel, (size, mtime) in scan_pdfs(self.output_dir).items():
+            known = self.files.get(rel)
+            if known is not None and known[:2] == (size, mtime) and known[2]:
+                doi = known[2]
+            else:
+                name = Path(rel).name
+                doi = from_results.get(name) or wanted_by_filename.get(FILENAME_SUFFIX.sub('', name))
+                doi = doi_key(normalize_doi(doi)) if doi else None
+            files[rel] = (size, mtime, doi)
+        self.files = files
+
+        by_doi = {}
+        for rel, (_, _, doi) in sorted(files.items()):
+            # Prefer a real PDF over an HTML-text fallback for the same DOI
+            if doi and (doi not in by_doi or '_htmlfallback' in by_doi[doi]):
+                by_doi[doi] = rel
+        return by_doi
+
+    def remove(self, rel: str):
+        (self.output_dir / rel).unlink(missing_ok=True)
+        self.files.pop(rel, None)
+
+    def save(self):
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': time.time(), 'files': {rel: list(entry) for rel, entry in self.files.items()}}, f)
+        os.replace(tmp, self.path)
+
+
+class SyncPlan:
+    def __init__(self, wanted: dict, by_doi: dict, manifest: CorpusManifest, previous: set):
+        self.present = [doi for doi in wanted if doi in by_doi]
+        # Downloaded by an earlier sync but the file has since gone (deleted, moved, invalid)
+        self.missing = [wanted[doi] for doi in wanted if doi not in by_doi and doi in previous]
+        self.new = [wanted[doi] for doi in wanted if doi not in by_doi and doi not in previous]
+        # Only files known to belong to another DOI; a PDF with no DOI (e.g. added by hand) is never an orphan
+        self.orphans = sorted(rel for rel, (_, _, doi) in manifest.files.items() if doi and doi not in wanted)
+        self.unmapped = sorted(rel for rel, (_, _, doi) in manifest.files.items() if not doi)
+
+    @property
+    def to_download(self) -> list:
+        return self.missing + self.new
+
+    def describe(self) -> str:
+        return (f"{len(self.present)} present, {len(self.new)} new, {len(self.missing)} missing, "
+                f"{len(self.orphans)} orphaned files, {len(self.unmapped)} files with no known DOI")
+
+
+def load_wanted(sources) -> dict:
+    """doi key -> DOI as written in the first source that lists it.
+
+    Tables must have a DOI column and values that do not look like a DOI are
+    dropped, so a wrong file cannot turn titles into the wanted set; raises
+    ValueError for a source that yields no DOIs at all.
+    """
+    wanted = {}
+    for source in sources:
+        dois = [normalize_doi(doi) for doi in load_doi_list(source, require_column=True)]
+        valid = [doi for doi in dois if DOI_SHAPE.match(doi)]
+        if dois and not valid:
+            raise ValueError(f"{source}: none of its {len(dois)} entries look like a DOI")
+        if len(valid) < len(dois):
+            logger.warning(f"{source}: skipped {len(dois) - len(valid)} entries that do not look like a DOI")
+        for doi in valid:
+            wanted.setdefault(doi_key(doi), doi)
+        logger.info(f"{len(valid)} DOIs in {source}")
+    return wanted
+
+
+def plan_sync(sources, output_dir):
+    wanted = load_wanted(sources)
+    manifest = CorpusManifest(output_dir)
+    previous = {doi for _, _, doi in manifest.files.values() if doi}
+    by_doi = manifest.refresh({safe_filename(doi): doi for doi in wanted.values()})
+    return SyncPlan(wanted, by_doi, manifest, previous), manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Download only the papers that are new or missing from output_dir",
+        epilog="Unrecognised options (e.g. --workers 16 --skip-paywalled) are passed on to download_papers.py.")
+    parser.add_argument('sources', nargs='+',
+                        help="metadata CSV from scraping.py and/or DOI lists (.txt, .csv/.tsv with a doi column, .xlsx)")
+    parser.add_argument('-o', '--output-dir', required=True, help="existing corpus directory to bring up to date")
+    parser.add_argument('--remove-orphans', action='store_true', help="delete PDFs whose DOI is in none of the sources")
+    parser.add_argument('--dry-run', action='store_true', help="only print what would be downloaded and removed")
+    args, downloader_args = parser.parse_known_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    output_dir = Path(args.output_dir).expanduser()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        plan, manifest = plan_sync(args.sources, output_dir)
+    except ValueError as e:
+        parser.error(str(e))
+    logger.info(f"Corpus {output_dir}: {plan.describe()}")
+    if args.remove_orphans and plan.orphans and not plan.present:
+        # Nothing on disk matches the sources: far more likely the wrong input than a corpus to wipe
+        parser.error(f"none of the {len(manifest.files)} files in {output_dir} match the sources; "
+                     f"refusing to remove {len(plan.orphans)} orphans")
+
+    if args.dry_run:
+        for doi in plan.to_download:
+            print(f"download\t{doi}")
+        for rel in plan.orphans:
+            print(f"{'remove' if args.remove_orphans else 'orphan'}\t{rel}")
+        return plan
+
+    if args.remove_orphans and plan.orphans:
+        for rel in plan.orphans:
+            manifest.remove(rel)
+        logger.info(f"Removed {len(plan.orphans)} orphaned files")
+    manifest.save()
+
+    if plan.to_download:
+        todo = output_dir / 'sync_todo.txt'
+        todo.write_text(''.join(doi + '\n' for doi in plan.to_download), encoding='utf-8')
+        from download_papers import main as download_main
+        download_main([str(todo), '-o', str(output_dir)] + downloader_args)
+        manifest.refresh({safe_filename(doi): doi for doi in plan.to_download})
+        manifest.save()
+    return plan
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import csv
+from pathlib import Path
+
+DOI_COLUMNS = ['doi', 'DOI', 'Doi', 'doi_link', 'url', 'link']
+
+
+def load_doi_list(path: str, require_column: bool = False) -> list:
+    """Read DOIs from a plain list (.txt, one per line), a CSV, or anything pandas can read.
+
+    Plain lists and CSVs are read with the standard library so short shard jobs
+    do not pay for importing pandas; only Excel and friends fall back to it.
+    A table without a DOI column is read from its first column, unless
+    `require_column` is set, in which case it raises ValueError.
+    """
+    path = Path(path).expanduser()
+    suffix = path.suffix.lower()
+    if suffix in ('.txt', '.lst', ''):
+        with open(path, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    if suffix in ('.csv', '.tsv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f, delimiter='\t' if suffix == '.tsv' else ',')
+            header = next(reader, [])
+            doi_column = next((col for col in DOI_COLUMNS if col in header), None)
+            if doi_column is None and require_column:
+                raise ValueError(f"{path} has no DOI column (expected one of {', '.join(DOI_COLUMNS)})")
+            doi_column = doi_column or (header[0] if header else None)
+            if doi_column is None:
+                return []
+            index = header.index(doi_column)
+            return [row[index].strip() for row in reader if len(row) > index and row[index].strip()]
+
+    import pandas as pd
+    df = pd.read_excel(path) if suffix in ('.xls', '.xlsx') else pd.read_csv(path)
+    doi_column = next((col for col in DOI_COLUMNS if col in df.columns), None)
+    if doi_column is None and require_column:
+        raise ValueError(f"{path} has no DOI column (expected one of {', '.join(DOI_COLUMNS)})")
+    doi_column = doi_column or df.columns[0]
+    return [str(doi) for doi in df[doi_column].dropna().tolist()]
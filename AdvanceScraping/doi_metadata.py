@@ -0,0 +1,166 @@
+import gzip
+import json
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+OPEN_ACCESS = 'open_access'
+PAYWALLED = 'paywalled'
+UNKNOWN = 'unknown'
+
+
+class DOIRecord:
+    __slots__ = ('doi', 'publisher', 'license', 'pdf_url', 'landing_url', 'route')
+
+    def __init__(self, doi, publisher=None, license=None, pdf_url=None, landing_url=None, route=UNKNOWN):
+        self.doi = doi
+        self.publisher = publisher
+        self.license = license
+        self.pdf_url = pdf_url
+        self.landing_url = landing_url
+        self.route = route
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+DOI_PREFIXES = ('doi:', 'https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/')
+
+
+def normalize_doi(doi: str) -> str:
+    """'https://doi.org/10.1/X' -> '10.1/X'; case is kept (doi_key lowercases)."""
+    doi = doi.strip()
+    for prefix in DOI_PREFIXES:
+        if doi.lower().startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
+
+def doi_key(doi: str) -> str:
+    return doi.strip().lower()
+
+
+def from_unpaywall(item: dict) -> DOIRecord:
+    best = item.get('best_oa_location') or {}
+    if item.get('is_oa'):
+        route = OPEN_ACCESS
+    elif 'is_oa' in item:
+        route = PAYWALLED
+    else:
+        route = UNKNOWN
+    return DOIRecord(
+        doi=item.get('doi'),
+        publisher=item.get('publisher'),
+        license=best.get('license'),
+        pdf_url=best.get('url_for_pdf'),
+        landing_url=best.get('url_for_landing_page') or best.get('url'),
+        route=route,
+    )
+
+
+def from_crossref(item: dict) -> DOIRecord:
+    licenses = [lic.get('URL', '') for lic in item.get('license', [])]
+    open_license = next((url for url in licenses if 'creativecommons.org' in url), None)
+    pdf_url = next((link.get('URL') for link in item.get('link', [])
+                    if link.get('content-type') == 'application/pdf'), None)
+    # Crossref says nothing about paywalls, only about licenses, so never mark PAYWALLED from it
+    return DOIRecord(
+        doi=item.get('DOI'),
+        publisher=item.get('publisher'),
+        license=open_license or (licenses[0] if licenses else None),
+        pdf_url=pdf_url,
+        landing_url=(item.get('resource') or {}).get('primary', {}).get('URL'),
+        route=OPEN_ACCESS if open_license else UNKNOWN,
+    )
+
+
+class MetadataSource(ABC):
+    """Looks up many DOIs at once. Subclasses return {doi_key: DOIRecord} for the DOIs they know."""
+
+    batch_size = 100
+
+    @abstractmethod
+    def lookup_many(self, dois: list) -> dict:
+        raise NotImplementedError
+
+
+class LocalDumpSource(MetadataSource):
+    """Streams an Unpaywall or Crossref JSONL dump (optionally .gz) and keeps only the wanted DOIs."""
+
+    def __init__(self, path: str, fmt: str = 'unpaywall'):
+        self.path = Path(path).expanduser()
+        self.parse = from_unpaywall if fmt == 'unpaywall' else from_crossref
+        self.batch_size = None  # a dump is scanned once for the whole input
+
+    def lookup_many(self, dois: list) -> dict:
+        wanted = {doi_key(doi) for doi in dois}
+        found = {}
+        opener = gzip.open if self.path.suffix == '.gz' else open
+        with opener(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                key = doi_key(item.get('doi') or item.get('DOI') or '')
+                if key in wanted:
+                    found[key] = self.parse(item)
+                    if len(found) == len(wanted):
+                        break
+        return found
+
+
+class CrossrefBatchSource(MetadataSource):
+    """Crossref works API; filter=doi:a,doi:b,... resolves a whole batch in one request."""
+
+    batch_size = 50
+
+    def __init__(self, session, mailto: str = None):
+        self.session = session
+        self.mailto = mailto
+
+    def lookup_many(self, dois: list) -> dict:
+        params = {'filter': ','.join(f"doi:{doi}" for doi in dois), 'rows': len(dois)}
+        if self.mailto:
+            params['mailto'] = self.mailto
+        response = self.session.get('https://api.crossref.org/works', params=params, timeout=60)
+        response.raise_for_status()
+        items = response.json().get('message', {}).get('items', [])
+        return {doi_key(item['DOI']): from_crossref(item) for item in items}
+
+
+class StubSource(MetadataSource):
+    """In-memory source for local runs and tests: {doi: unpaywall-style dict}."""
+
+    def __init__(self, records: dict):
+        self.records = {doi_key(doi): item for doi, item in records.items()}
+
+    def lookup_many(self, dois: list) -> dict:
+        found = {}
+        for doi in dois:
+            item = self.records.get(doi_key(doi))
+            if item is not None:
+                found[doi_key(doi)] = from_unpaywall(dict(item, doi=doi))
+        return found
+
+
+def prefetch_metadata(dois: list, source: MetadataSource) -> dict:
+    """Resolve metadata for every DOI in batches; DOIs the source does not know are tagged UNKNOWN."""
+    records = {}
+    unique = list(dict.fromkeys(doi_key(doi) for doi in dois))
+    batch_size = source.batch_size or len(unique) or 1
+    for start in range(0, len(unique), batch_size):
+        batch = unique[start:start + batch_size]
+        try:
+            records.update(source.lookup_many(batch))
+        except Exception as e:
+            logger.warning(f"Metadata lookup failed for batch starting at {start}: {e}")
+    for key in unique:
+        records.setdefault(key, DOIRecord(key))
+
+    routes = {}
+    for record in records.values():
+        routes[record.route] = routes.get(record.route, 0) + 1
+    logger.info(f"Prefetched metadata for {len(unique)} DOIs: {routes}")
+    return records
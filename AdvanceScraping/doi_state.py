@@ -0,0 +1,91 @@
+import sys
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from concurrency import FixedConcurrency
+
+# Interned status codes; one byte per DOI in DOIStateTable instead of a dict per result
+STATUSES = ('pending', 'downloaded', 'html_text_saved', 'failed', 'skipped_paywalled', 'invalid_pdf', 'in_flight',
+            'deferred', 'claimed_elsewhere', 'doi_mismatch')
+STATUS_CODE = {status: code for code, status in enumerate(STATUSES)}
+
+
+class DOIStateTable:
+    """Struct-of-arrays state for every DOI in a run.
+
+    DOIs are stored once (interned) and the per-DOI state is a couple of bytes in
+    typed arrays, so a few million rows cost tens of MB rather than gigabytes of
+    per-row dicts and futures.
+    """
+
+    def __init__(self, dois=()):
+        self.dois = []
+        self.status = array('B')
+        self.attempts = array('B')
+        for doi in dois:
+            self.add(doi)
+
+    def add(self, doi: str) -> int:
+        self.dois.append(sys.intern(doi))
+        self.status.append(0)
+        self.attempts.append(0)
+        return len(self.dois) - 1
+
+    def __len__(self):
+        return len(self.dois)
+
+    def set_status(self, index: int, status: str):
+        self.status[index] = STATUS_CODE[status]
+
+    def get_status(self, index: int) -> str:
+        return STATUSES[self.status[index]]
+
+    def mark_attempt(self, index: int):
+        if self.attempts[index] < 255:
+            self.attempts[index] += 1
+
+    def indices(self, *statuses) -> list:
+        codes = {STATUS_CODE[status] for status in statuses}
+        return [i for i, code in enumerate(self.status) if code in codes]
+
+    def counts(self) -> dict:
+        counts = [0] * len(STATUSES)
+        for code in self.status:
+            counts[code] += 1
+        return {status: counts[code] for code, status in enumerate(STATUSES) if counts[code]}
+
+
+def concurrency_limit(window):
+    """An int window becomes a FixedConcurrency; controllers (AdaptiveConcurrency) pass through."""
+    return window if hasattr(window, 'task_done') else FixedConcurrency(window)
+
+
+def bounded_submit(executor, fn, items, window):
+    """Like submitting everything and looping over as_completed, but with at most `window` tasks in flight.
+
+    `items` can be any iterable (including a generator over a huge file); it is
+    only advanced as slots free up. Yields (item, future) pairs as they finish.
+    `window` is an int or a concurrency controller whose limit is re-read on every refill.
+    """
+    items = iter(items)
+    controller = concurrency_limit(window)
+    in_flight = {}
+
+    def fill():
+        while len(in_flight) < controller.limit:
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            controller.task_started()
+            in_flight[executor.submit(fn, item)] = (item, time.monotonic())
+
+    fill()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            item, started = in_flight.pop(future)
+            controller.task_done(time.monotonic() - started)
+            yield item, future
+        fill()
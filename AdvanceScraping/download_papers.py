@@ -0,0 +1,143 @@
+"""Command-line entry point for the DOI downloaders.
+
+    python download_papers.py pubmed_doi.csv -o ~/papers --engine threads --workers 16
+
+Only argparse and the standard library are imported up front; the engine
+module (and with it requests, bs4, tqdm, fpdf) is loaded once the arguments
+are known, so --help and argument errors return immediately.
+"""
+import argparse
+import importlib.util
+import inspect
+import sys
+from datetime import datetime
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ENGINES = {
+    'threads': HERE / 'paper_downloader_version3(parallel).py',
+    'sequential': HERE / 'paper_downloader_version4.py',
+}
+
+
+def load_engine(name: str):
+    path = ENGINES[name]
+    if str(HERE) not in sys.path:
+        sys.path.insert(0, str(HERE))
+    spec = importlib.util.spec_from_file_location(f"paper_downloader_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.SimpleDOIDownloader
+
+
+# Downloader __init__ parameter -> the command-line options (argparse dests) that feed it,
+# where the two names differ
+OPTION_SOURCES = {
+    'metadata_source': ('metadata_dump', 'crossref_mailto'),
+    'max_workers': ('workers',),
+    'adaptive': ('fixed_workers',),
+    'max_concurrency': ('max_workers',),
+    'corpus_index_db': ('index_db',),
+    'coordinator': ('coordination_db',),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Download papers for a list of DOIs")
+    parser.add_argument('input', help="DOI list: .txt (one per line), .csv/.tsv with a doi column, or .xlsx")
+    parser.add_argument('-o', '--output-dir', default=None,
+                        help="where to save papers (default: ./downloadedresearchpapers_<timestamp>)")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='threads')
+    parser.add_argument('--workers', type=int, default=10,
+                        help="concurrent downloads (threads engine); the starting point unless --fixed-workers")
+    parser.add_argument('--max-workers', type=int, default=64,
+                        help="ceiling for the adaptive concurrency controller")
+    parser.add_argument('--fixed-workers', action='store_true',
+                        help="keep exactly --workers downloads running instead of adapting to throughput and errors")
+    parser.add_argument('--per-host-rate', type=float, default=1.0, help="max requests per second to any one host")
+    parser.add_argument('--max-per-host', type=int, default=2, help="max concurrent downloads per publisher")
+    parser.add_argument('--deadline', type=float, help="stop starting new DOIs after this many seconds")
+    parser.add_argument('--retry-delay', type=float, default=2.0, help="seconds to wait between source attempts")
+    parser.add_argument('--results-format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--page-cache-dir', default="~/.cache/doi_downloader/pages")
+    parser.add_argument('--metadata-dump', help="Unpaywall/Crossref JSONL dump used to route DOIs before downloading")
+    parser.add_argument('--metadata-format', choices=['unpaywall', 'crossref'], default='unpaywall')
+    parser.add_argument('--crossref-mailto', help="resolve metadata through the Crossref API (polite pool address)")
+    parser.add_argument('--skip-paywalled', action='store_true')
+    parser.add_argument('--validate-first-page', action='store_true', help="also check page 1 for the DOI (pypdf)")
+    parser.add_argument('--coordination-db', help="SQLite file shared by instances splitting the same input")
+    parser.add_argument('--worker-id', help="name of this instance in the coordination db (default host:pid)")
+    parser.add_argument('--index-db', help="update this full-text index after the run")
+    parser.add_argument('--slow-threshold', type=float,
+                        help="time each download stage and log DOIs slower than this many seconds "
+                             "to slow_requests.jsonl in the output dir")
+    return parser
+
+
+def check_engine_options(parser, args, downloader_cls, params):
+    """Refuse options the engine would silently ignore (e.g. --coordination-db with --engine sequential)."""
+    accepted = inspect.signature(downloader_cls.__init__).parameters
+    unsupported = []
+    for param in params:
+        if param in accepted:
+            continue
+        for dest in OPTION_SOURCES.get(param, (param,)):
+            if getattr(args, dest) != parser.get_default(dest):
+                unsupported.append('--' + dest.replace('_', '-'))
+    if unsupported:
+        parser.error(f"{', '.join(unsupported)} not supported by the {args.engine} engine")
+    return accepted
+
+
+def main(argv=None, downloader_cls=None, engine: str = None):
+    # A version file run directly passes its own class and engine name; --engine cannot switch it
+    parser = build_parser()
+    if engine is not None:
+        parser.set_defaults(engine=engine)
+    args = parser.parse_args(argv)
+    if engine is not None and args.engine != engine:
+        parser.error(f"this script is the {engine} engine; use download_papers.py --engine {args.engine}")
+    output_dir = args.output_dir or f"./downloadedresearchpapers_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    if downloader_cls is None:
+        downloader_cls = load_engine(args.engine)
+
+    options = {
+        'results_format': args.results_format,
+        'page_cache_dir': args.page_cache_dir,
+        'metadata_source': None,
+        'skip_paywalled': args.skip_paywalled,
+        'max_workers': args.workers,
+        'adaptive': not args.fixed_workers,
+        'max_concurrency': args.max_workers,
+        'per_host_rate': args.per_host_rate,
+        'retry_delay': args.retry_delay,
+        'max_per_host': args.max_per_host,
+        'deadline': args.deadline,
+        'validate_first_page': args.validate_first_page,
+        'corpus_index_db': args.index_db,
+        'coordinator': None,
+        'worker_id': args.worker_id,
+        'slow_threshold': args.slow_threshold,
+    }
+    accepted = check_engine_options(parser, args, downloader_cls, options)
+    # Anything the engine does not take was left at its default, so it is simply not passed
+    options = {key: value for key, value in options.items() if key in accepted}
+
+    if args.metadata_dump:
+        from doi_metadata import LocalDumpSource
+        options['metadata_source'] = LocalDumpSource(args.metadata_dump, fmt=args.metadata_format)
+    elif args.crossref_mailto:
+        import requests
+        from doi_metadata import CrossrefBatchSource
+        options['metadata_source'] = CrossrefBatchSource(requests.Session(), mailto=args.crossref_mailto)
+
+    if args.coordination_db:
+        from coordination import SQLiteCoordinator
+        options['coordinator'] = SQLiteCoordinator(args.coordination_db)
+
+    downloader = downloader_cls(csv_file=args.input, output_dir=output_dir, **options)
+    downloader.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+
+
+class StatsAggregator:
+    """Per-worker counters that are only summed when someone asks for a snapshot.
+
+    Each thread (and therefore every asyncio task running on that thread) gets its
+    own counter dict, so the hot path is a plain dict increment with no lock.
+    Worker processes keep a ProcessCounters and ship deltas back through a queue.
+    """
+
+    def __init__(self, keys=('success', 'failed', 'skipped')):
+        self.keys = tuple(keys)
+        self.total = 0
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._remote = dict.fromkeys(self.keys, 0)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, 'counters', None)
+        if shard is None:
+            shard = dict.fromkeys(self.keys, 0)
+            self._local.counters = shard
+            # Registration happens once per thread, never per item
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def incr(self, key: str, n: int = 1):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + n
+
+    def merge(self, delta: dict):
+        for key, value in delta.items():
+            self._remote[key] = self._remote.get(key, 0) + value
+
+    def drain(self, queue):
+        """Merge every delta a worker process has pushed so far."""
+        while True:
+            try:
+                delta = queue.get_nowait()
+            except Exception:
+                return
+            self.merge(delta)
+
+    def snapshot(self) -> dict:
+        totals = dict(self._remote)
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0) + value
+        totals['total'] = self.total
+        totals['done'] = sum(totals.get(key, 0) for key in self.keys)
+        return totals
+
+    def __getitem__(self, key):
+        return self.snapshot()[key]
+
+
+class ProcessCounters:
+    """Counter for a worker process; pushes its delta to the parent every flush_interval seconds."""
+
+    def __init__(self, queue, keys=('success', 'failed', 'skipped'), flush_interval: float = 1.0):
+        self.queue = queue
+        self.keys = tuple(keys)
+        self.flush_interval = flush_interval
+        self._pending = dict.fromkeys(self.keys, 0)
+        self._last_flush = time.monotonic()
+
+    def incr(self, key: str, n: int = 1):
+        self._pending[key] = self._pending.get(key, 0) + n
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if any(self._pending.values()):
+            self.queue.put(self._pending)
+            self._pending = dict.fromkeys(self.keys, 0)
+        self._last_flush = time.monotonic()
+
+
+class ProgressReporter:
+    """Refreshes a tqdm bar at a fixed rate from StatsAggregator snapshots.
+
+    ETA comes from throughput over the last `window` seconds rather than the
+    whole-run average, so it follows slowdowns and speedups quickly.
+    """
+
+    def __init__(self, stats: StatsAggregator, pbar=None, interval: float = 0.5, window: float = 30.0,
+                 process_queue=None):
+        self.stats = stats
+        self.pbar = pbar
+        self.interval = interval
+        self.window = window
+        self.process_queue = process_queue
+        self._samples = deque()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def throughput(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, d0), (t1, d1) = self._samples[0], self._samples[-1]
+        return (d1 - d0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def eta(self, done: int, total: int):
+        rate = self.throughput()
+        if rate <= 0 or total <= done:
+            return None
+        return (total - done) / rate
+
+    def refresh(self) -> dict:
+        if self.process_queue is not None:
+            self.stats.drain(self.process_queue)
+        snap = self.stats.snapshot()
+        now = time.monotonic()
+        self._samples.append((now, snap['done']))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+        if self.pbar is not None:
+            self.pbar.n = snap['done']
+            eta = self.eta(snap['done'], snap['total'])
+            self.pbar.set_postfix({
+                'Success': snap.get('success', 0),
+                'Failed': snap.get('failed', 0),
+                'Rate': f"{self.throughput():.2f}/s",
+                'ETA': time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else '--',
+            }, refresh=False)
+            self.pbar.refresh()
+        return snap
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='progress-reporter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.refresh()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
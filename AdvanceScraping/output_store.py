@@ -0,0 +1,192 @@
+import atexit
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+
+class ShardedOutput:
+    """Maps output filenames into hash-prefix subdirectories: 10.1016_x.pdf -> 3f/a2/10.1016_x.pdf.
+
+    Keeps every directory to a few thousand entries even at millions of files.
+    Paths handed out are relative to root so results files stay portable.
+    """
+
+    def __init__(self, root, levels: int = 2, width: int = 2):
+        self.root = Path(root).expanduser()
+        self.levels = levels
+        self.width = width
+
+    def relative_path(self, filename: str) -> Path:
+        if not self.levels:
+            return Path(filename)
+        digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+        parts = [digest[i * self.width:(i + 1) * self.width] for i in range(self.levels)]
+        return Path(*parts, filename)
+
+    def path_for(self, filename: str) -> Path:
+        return self.root / self.relative_path(filename)
+
+
+class BackgroundWriter:
+    """Single writer thread that takes file writes off the download workers.
+
+    Writes are grouped into batches: each file goes to a temp name and is
+    fsync'd, then the batch is renamed into place with one directory sync per
+    shard, so a crash never leaves a half-written PDF under its final name.
+    A write that fails is recorded in `errors` and reported to the on_error
+    callbacks registered with when_written().
+    """
+
+    def __init__(self, batch_size: int = 32, batch_interval: float = 1.0, fsync: bool = True, max_pending: int = 1024):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self.errors = []
+        self._thread = threading.Thread(target=self._loop, name='output-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, path, data):
+        path = Path(path)
+        with self._lock:
+            self._pending.setdefault(path, [])
+            self._failed.pop(path, None)
+        self._queue.put((path, bytes(data) if isinstance(data, bytearray) else data))
+
+    def when_written(self, path, callback, on_error=None):
+        """Run callback() once path is on disk, or on_error(exc) if writing it failed.
+
+        Runs immediately if the write has already finished (or was never queued).
+        """
+        path = Path(path)
+        with self._lock:
+            if path in self._pending:
+                self._pending[path].append((callback, on_error))
+                return
+            error = self._failed.get(path)
+        if error is None:
+            callback()
+        elif on_error is not None:
+            on_error(error)
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch):
+        written = []
+        for path, data in batch:
+            tmp = path.with_name(path.name + '.part')
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                f = open(tmp, 'w', encoding='utf-8') if isinstance(data, str) else open(tmp, 'wb')
+                with f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                written.append((path, tmp))
+            except OSError as e:
+                self._finish(path, e)
+
+        # One rename + directory sync pass for the whole batch
+        dirs = set()
+        for path, tmp in written:
+            try:
+                os.replace(tmp, path)
+                dirs.add(path.parent)
+            except OSError as e:
+                self._finish(path, e)
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            for directory in dirs:
+                fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        # Paths whose rename failed were already finished with their error above
+        for path, _ in written:
+            self._finish(path)
+
+    def _finish(self, path, error=None):
+        with self._lock:
+            callbacks = self._pending.pop(path, None)
+            if callbacks is None:
+                return
+            if error is not None:
+                self._failed[path] = error
+                self.errors.append((path, error))
+        for callback, on_error in callbacks:
+            try:
+                if error is None:
+                    callback()
+                elif on_error is not None:
+                    on_error(error)
+            except Exception as e:
+                self.errors.append((path, e))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def setup_async_logging(log_file, level=logging.INFO, fmt='%(asctime)s - %(levelname)s - %(message)s'):
+    """Route all logging through a QueueHandler so workers never wait on the log file or terminal.
+
+    Console handlers already on the root logger (e.g. from a caller's basicConfig) are replaced,
+    since the listener writes to the console itself. Returns the QueueListener;
+    stop_async_logging() is also registered at exit so buffered records are flushed.
+    """
+    formatter = logging.Formatter(fmt)
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        # Plain StreamHandler only; FileHandler subclasses it and is left alone
+        if isinstance(handler, logging.handlers.QueueHandler) or type(handler) is logging.StreamHandler:
+            root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_async_logging, listener)
+    return listener
+
+
+def stop_async_logging(listener):
+    # QueueListener.stop() is not idempotent, and it is also registered with atexit
+    if listener._thread is not None:
+        listener.stop()
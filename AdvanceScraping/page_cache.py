@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from download_stats import StatsAggregator
+
+
+class CachedPage:
+    """Quacks like the bits of requests.Response that download_single_paper uses."""
+
+    def __init__(self, url: str, content_type: str, body: bytes, encoding: str = 'utf-8'):
+        self.url = url
+        self.status_code = 200
+        self.headers = {'content-type': content_type}
+        self.content = body
+        self.encoding = encoding or 'utf-8'
+        self.from_cache = True
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+
+class LandingPageCache:
+    """Gzip'd on-disk cache of HTML landing pages keyed by final (post-redirect) URL.
+
+    ETag / Last-Modified are kept with each page so a rerun sends a conditional
+    request and usually gets a 304 instead of the full page. Entries are evicted
+    least-recently-used once the cache grows beyond max_bytes. Pages younger
+    than fresh_for seconds are served without touching the network at all.
+    """
+
+    def __init__(self, cache_dir: str = "~/.cache/doi_downloader/pages", max_bytes: int = 2 * 1024 ** 3,
+                 fresh_for: float = 0):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.cache_dir / 'index.sqlite3'), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY, key TEXT, content_type TEXT, encoding TEXT,
+                etag TEXT, last_modified TEXT, size INTEGER, last_access REAL, stored_at REAL);
+            CREATE TABLE IF NOT EXISTS aliases (request_url TEXT PRIMARY KEY, url TEXT);
+            CREATE INDEX IF NOT EXISTS pages_last_access ON pages(last_access);
+            CREATE INDEX IF NOT EXISTS aliases_url ON aliases(url);
+        """)
+        # Running total of page sizes so store() does not sum the whole table; re-synced before evicting
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        # Bumped from every download thread; per-thread shards, no shared counter to race on
+        self.counters = StatsAggregator(keys=('hits', 'revalidated', 'misses'))
+
+    @property
+    def hits(self) -> int:
+        return self.counters['hits']
+
+    @property
+    def revalidated(self) -> int:
+        return self.counters['revalidated']
+
+    @property
+    def misses(self) -> int:
+        return self.counters['misses']
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.html.gz"
+
+    def _lookup(self, url: str):
+        # Two primary-key lookups; an OR across the join cannot use either index
+        query = ("SELECT url, key, content_type, encoding, etag, last_modified, stored_at "
+                 "FROM pages WHERE url = ?")
+        with self._lock:
+            row = self._db.execute(query, (url,)).fetchone()
+            if row is None:
+                alias = self._db.execute("SELECT url FROM aliases WHERE request_url = ?", (url,)).fetchone()
+                if alias is not None:
+                    row = self._db.execute(query, (alias[0],)).fetchone()
+        return row
+
+    def contains(self, url: str) -> bool:
+        return self._lookup(url) is not None
+
+    def conditional_headers(self, url: str) -> dict:
+        row = self._lookup(url)
+        if not row:
+            return {}
+        headers = {}
+        if row[4]:
+            headers['If-None-Match'] = row[4]
+        if row[5]:
+            headers['If-Modified-Since'] = row[5]
+        return headers
+
+    def is_fresh(self, url: str) -> bool:
+        if not self.fresh_for:
+            return False
+        row = self._lookup(url)
+        return bool(row) and time.time() - (row[6] or 0) < self.fresh_for
+
+    def load(self, url: str, revalidated: bool = False):
+        row = self._lookup(url)
+        if not row:
+            return None
+        final_url, key, content_type, encoding = row[:4]
+        try:
+            with gzip.open(self._path(key), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            now = time.time()
+            if revalidated:
+                self._db.execute("UPDATE pages SET last_access = ?, stored_at = ? WHERE url = ?",
+                                 (now, now, final_url))
+            else:
+                self._db.execute("UPDATE pages SET last_access = ? WHERE url = ?", (now, final_url))
+            self._db.commit()
+        return CachedPage(final_url, content_type, body, encoding)
+
+    def store(self, request_url: str, response):
+        final_url = response.url or request_url
+        key = hashlib.sha1(final_url.encode('utf-8')).hexdigest()
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = gzip.compress(response.content, compresslevel=6)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM pages WHERE url = ?", (final_url,)).fetchone()
+            self._total += len(data) - ((old[0] or 0) if old else 0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (final_url, key, response.headers.get('content-type', ''), response.encoding,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), len(data),
+                 time.time(), time.time()))
+            if request_url != final_url:
+                self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?, ?)", (request_url, final_url))
+            self._db.commit()
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            # Another process may share the cache; count for real before deleting anything
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total <= self.max_bytes:
+                self._total = total
+                return
+            victims = []
+            for url, key, size in self._db.execute("SELECT url, key, size FROM pages ORDER BY last_access"):
+                if total <= self.max_bytes * 0.9:
+                    break
+                victims.append((url, key))
+                total -= size
+            for url, key in victims:
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._db.execute("DELETE FROM aliases WHERE url = ?", (url,))
+                self._path(key).unlink(missing_ok=True)
+            self._db.commit()
+            self._total = total
+
+    def get(self, session, url: str, **kwargs):
+        """session.get() with conditional revalidation; returns a Response or a CachedPage."""
+        if self.is_fresh(url):
+            cached = self.load(url)
+            if cached is not None:
+                self.counters.incr('hits')
+                return cached
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.update(self.conditional_headers(url))
+        response = session.get(url, headers=headers, **kwargs)
+        if response.status_code == 304:
+            cached = self.load(url, revalidated=True)
+            if cached is not None:
+                self.counters.incr('revalidated')
+                return cached
+            # Index said we had it but the body is gone; refetch unconditionally
+            response = session.get(url, **kwargs)
+        if response.status_code == 200 and 'html' in response.headers.get('content-type', '').lower():
+            self.counters.incr('misses')
+            self.store(url, response)
+        return response
+
+    def close(self):
+        with self._lock:
+            self._db.close()
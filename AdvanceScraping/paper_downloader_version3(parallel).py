@@ -1,32 +1,44 @@
-import pandas as pd
 import requests
 from pathlib import Path
-import time
 import logging
+import time
 from urllib.parse import urlparse
 import re
-import json
-from tqdm import tqdm
-from bs4 import BeautifulSoup
-from fpdf import FPDF
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from download_stats import StatsAggregator, ProgressReporter
+from results_sink import open_results_sink, load_results
+from page_cache import LandingPageCache
+from publisher_resolvers import resolve_pdf_urls, resolve_landing_pdf_urls, host_key
+from doi_metadata import prefetch_metadata, doi_key, PAYWALLED, OPEN_ACCESS
+from pdf_validation import PDFValidationPool
+from corpus_index import CorpusIndex, doi_map_from_results
+from doi_input import load_doi_list
+from rate_limit import HostRateLimiter
+from output_store import ShardedOutput, BackgroundWriter, setup_async_logging
+from doi_state import DOIStateTable, bounded_submit
+from scheduler import DOIScheduler, scheduled_submit, PRIORITY_FAST, PRIORITY_NEW, PRIORITY_RETRY
+from coordination import GlobalHostRateLimiter, LeaseKeeper, default_worker_id
+from request_profiler import RequestProfiler
+from concurrency import AdaptiveConcurrency
 
 
 class SimpleDOIDownloader:
-    def __init__(self, csv_file: str, output_dir: str):
+    def __init__(self, csv_file: str, output_dir: str, results_format: str = 'jsonl',
+                 page_cache_dir: str = "~/.cache/doi_downloader/pages",
+                 metadata_source=None, skip_paywalled: bool = False,
+                 validation_retries: int = 1, validate_first_page: bool = False,
+                 corpus_index_db: str = None, max_workers: int = 10,
+                 per_host_rate: float = 1.0, retry_delay: float = 2.0, shard_levels: int = 2,
+                 submit_window: int = 4, max_per_host: int = 2, deadline: float = None,
+                 coordinator=None, worker_id: str = None, slow_threshold: float = None,
+                 adaptive: bool = True, max_concurrency: int = 64):
         self.csv_file = csv_file
         self.output_dir = Path(output_dir).expanduser()
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.results_format = results_format
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.output_dir / 'download_log.txt'),
-                logging.StreamHandler()
-            ]
-        )
+        setup_async_logging(self.output_dir / 'download_log.txt')
         self.logger = logging.getLogger(__name__)
 
         self.session = requests.Session()
@@ -37,14 +49,43 @@ class SimpleDOIDownloader:
             'Connection': 'keep-alive',
         })
 
-        self.stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+        self.page_cache = LandingPageCache(page_cache_dir)
+        self.metadata_source = metadata_source
+        self.skip_paywalled = skip_paywalled
+        self.doi_metadata = {}
+        self.validation_retries = validation_retries
+        self.validate_first_page = validate_first_page
+        self.corpus_index_db = corpus_index_db
+        self.max_workers = max_workers
+        self.adaptive = adaptive
+        self.max_concurrency = max_concurrency
+        self.concurrency = None
+        self.submit_window = submit_window
+        self.max_per_host = max_per_host
+        self.deadline = deadline
+        self.state = DOIStateTable()
+        self.retry_delay = retry_delay
+        self.coordinator = coordinator
+        if coordinator is not None:
+            # Shared with every other instance using the same coordinator
+            self.rate_limiter = GlobalHostRateLimiter(coordinator, per_host_rate)
+            self.leases = LeaseKeeper(coordinator, worker_id or default_worker_id())
+        else:
+            self.rate_limiter = HostRateLimiter(per_host_rate)
+            self.leases = None
+        self.session.hooks['response'].append(self.rate_limiter.redirect_hook)
+        self.layout = ShardedOutput(self.output_dir, levels=shard_levels)
+        self.writer = BackgroundWriter()
+        self._write_failures = []
+        # doi key -> PDF URL fetched this run, shared with other instances once the file validates
+        self._fetched_urls = {}
+        self.stats = StatsAggregator()
+        # Off unless a threshold is given; then DOIs slower than it land in slow_requests.jsonl
+        self.profiler = RequestProfiler(self.output_dir / 'slow_requests.jsonl', slow_threshold)
 
     def load_dois(self):
         try:
-            df = pd.read_csv(self.csv_file)
-            doi_columns = ['doi', 'DOI', 'Doi', 'doi_link', 'url', 'link']
-            doi_column = next((col for col in doi_columns if col in df.columns), df.columns[0])
-            dois = df[doi_column].dropna().tolist()
+            dois = load_doi_list(self.csv_file)
             self.logger.info(f"Loaded {len(dois)} DOI links from {self.csv_file}")
             return dois
         except Exception as e:
@@ -64,46 +105,292 @@ class SimpleDOIDownloader:
         dois = self.load_dois()
         if not dois:
             return
-        self.stats['total'] = len(dois)
-        results = []
-
-        max_threads = min(10, len(dois))
-        self.logger.info(f"Using {max_threads} threads for downloading.")
-
-        with ThreadPoolExecutor(max_workers=max_threads) as executor:
-            futures = {executor.submit(self.download_single_paper, doi): doi for doi in dois}
-
-            with tqdm(total=len(futures), desc="Downloading papers") as pbar:
-                for future in as_completed(futures):
-                    result = future.result()
-                    results.append(result)
-                    pbar.update(1)
-                    if result['status'] == 'downloaded' or result['status'] == 'html_text_saved':
-                        self.stats['success'] += 1
-                    else:
-                        self.stats['failed'] += 1
-                    pbar.set_postfix({
-                        'Success': self.stats['success'],
-                        'Failed': self.stats['failed']
-                    })
-
-        results_file = self.output_dir / 'download_results.json'
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
-
+        self.stats.total = len(dois)
+        if self.metadata_source is not None:
+            self.doi_metadata = prefetch_metadata([self.normalize_doi(doi) for doi in dois], self.metadata_source)
+
+        # Only integers go through the pool; DOI strings live once, in the state table
+        self.state = DOIStateTable(dois)
+        del dois
+
+        if self.adaptive:
+            # max_workers is only the starting point; the pool is sized for the ceiling and
+            # the controller decides how many downloads actually run at once
+            max_threads = min(self.max_concurrency, len(self.state))
+            self.concurrency = AdaptiveConcurrency(initial=min(self.max_workers, max_threads), max_limit=max_threads,
+                                                   logger=self.logger)
+            window = self.concurrency
+            self.logger.info(f"Starting with {self.concurrency.limit} concurrent downloads, "
+                             f"adapting between 1 and {max_threads}.")
+        else:
+            max_threads = min(self.max_workers, len(self.state))
+            window = max_threads * self.submit_window
+            self.logger.info(f"Using {max_threads} threads for downloading ({window} tasks in flight).")
+
+        if self.leases is not None:
+            self.leases.start()
+
+        with ThreadPoolExecutor(max_workers=max_threads) as executor, \
+                PDFValidationPool(check_text=self.validate_first_page, logger=self.logger) as validator:
+            from tqdm import tqdm
+            with open_results_sink(self.output_dir, self.results_format) as results, \
+                    tqdm(total=len(self.state), desc="Downloading papers") as pbar, ProgressReporter(self.stats, pbar):
+                scheduler = self._build_scheduler()
+                for index, future in scheduled_submit(executor, self._download_index, scheduler, window):
+                    self._record(index, future.result(), results, validator)
+
+                deferred = 0
+                for index in scheduler.drain():
+                    self.state.set_status(index, 'deferred')
+                    results.write({'doi': self.state.dois[index], 'success': False, 'filename': None,
+                                   'status': 'deferred'})
+                    deferred += 1
+                if deferred:
+                    self.logger.warning(f"Deadline reached; {deferred} DOIs deferred to the next run")
+
+                # Our own DOIs are settled and completed before waiting on anyone else's,
+                # otherwise two instances can each wait for the other's unvalidated downloads
+                self._settle(executor, scheduler, window, results, validator)
+                if self.leases is not None:
+                    self._revisit_claimed(executor, scheduler, window, results, validator)
+
+        self.writer.flush()
+        if self.leases is not None:
+            self.leases.stop()
+        stats = self.stats.snapshot()
         self.logger.info("=" * 50)
         self.logger.info("DOWNLOAD SUMMARY")
         self.logger.info("=" * 50)
-        self.logger.info(f"Total DOIs: {self.stats['total']}")
-        self.logger.info(f"Successfully downloaded: {self.stats['success']}")
-        self.logger.info(f"Failed: {self.stats['failed']}")
-        success_rate = (self.stats['success'] / self.stats['total'] * 100) if self.stats['total'] > 0 else 0
+        self.logger.info(f"Total DOIs: {stats['total']}")
+        self.logger.info(f"Successfully downloaded: {stats['success']}")
+        self.logger.info(f"Failed: {stats['failed']}")
+        self.logger.info(f"Skipped (paywalled): {stats['skipped']}")
+        success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
         self.logger.info(f"Success rate: {success_rate:.1f}%")
+        self.logger.info(f"Landing pages: {self.page_cache.revalidated} revalidated (304), "
+                         f"{self.page_cache.hits} fresh hits, {self.page_cache.misses} fetched")
+        if self.profiler.enabled:
+            totals = self.profiler.totals()
+            total = totals.pop('total', 0.0)
+            self.logger.info(f"Time per stage (summed over workers, {total:.1f}s total): " +
+                             ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in
+                                       sorted(totals.items(), key=lambda item: -item[1])))
+            self.logger.info(f"Slow DOIs (>= {self.profiler.threshold}s): {self.profiler.slow_count}, "
+                             f"see {self.profiler.slow_log}")
+        if self.concurrency is not None and self.concurrency.history:
+            limits = [entry[1] for entry in self.concurrency.history]
+            self.logger.info(f"Concurrency: ended at {self.concurrency.limit} "
+                             f"(range {min(limits)}-{max(limits)} over {len(limits)} adjustments)")
         self.logger.info("=" * 50)
 
+        if self.corpus_index_db:
+            index = CorpusIndex(self.corpus_index_db)
+            index.index_directory(self.output_dir, doi_map_from_results(self.output_dir))
+            index.close()
+
+    def _previous_failures(self) -> set:
+        failed = set()
+        # Later rows win: a DOI that failed once but was downloaded afterwards is not a retry
+        for row in load_results(self.output_dir):
+            key = doi_key(self.normalize_doi(row['doi']))
+            if row['status'] in ('failed', 'invalid_pdf'):
+                failed.add(key)
+            else:
+                failed.discard(key)
+        return failed
+
+    def _priority(self, normalized_doi: str, previous_failures: set) -> int:
+        key = doi_key(normalized_doi)
+        if key in previous_failures:
+            return PRIORITY_RETRY
+        record = self.doi_metadata.get(key)
+        if (record is not None and record.route == OPEN_ACCESS) or resolve_pdf_urls(normalized_doi) \
+                or self.page_cache.contains(f"https://doi.org/{normalized_doi}"):
+            return PRIORITY_FAST
+        return PRIORITY_NEW
+
+    def _build_scheduler(self) -> DOIScheduler:
+        previous_failures = self._previous_failures()
+        scheduler = DOIScheduler(max_per_host=self.max_per_host, deadline=self.deadline)
+        for index, doi in enumerate(self.state.dois):
+            normalized_doi = self.normalize_doi(doi)
+            scheduler.push(index, host_key(normalized_doi), self._priority(normalized_doi, previous_failures))
+        return scheduler
+
+    def _download_index(self, index: int) -> dict:
+        self.state.mark_attempt(index)
+        doi = self.state.dois[index]
+        # Re-claiming a lease we already hold (validation retries) just extends it
+        if self.leases is not None and not self.leases.claim(doi):
+            self.stats.incr('skipped')
+            return {'doi': doi, 'success': False, 'filename': None, 'status': 'claimed_elsewhere'}
+        self.profiler.begin(doi)
+        result = self.download_single_paper(doi)
+        self.profiler.end(result['status'])
+        # Fetched PDFs are completed once validation has had its say (_complete_leases)
+        if self.leases is not None and result['status'] != 'downloaded':
+            self.leases.complete(doi, result['status'])
+        return result
+
+    def _settle(self, executor, scheduler: DOIScheduler, window, results, validator: PDFValidationPool):
+        """Wait for validation, re-download invalid PDFs, record DOI mismatches and complete held leases."""
+        # Corrupt/truncated PDFs were deleted by the validator; download them again
+        for attempt in range(self.validation_retries + 1):
+            self.writer.flush()
+            self._record_write_failures(results)
+            invalid = validator.take_invalid()
+            if not invalid:
+                break
+            for index, report in invalid:
+                self._forget_pdf_url(self.state.dois[index])
+                self.state.set_status(index, 'invalid_pdf')
+                self.stats.incr('success', -1)
+                results.write({'doi': self.state.dois[index], 'success': False, 'filename': None,
+                               'status': 'invalid_pdf', 'reason': report['reason']})
+            if attempt == self.validation_retries:
+                self.stats.incr('failed', len(invalid))
+                break
+            if scheduler.expired():
+                # No new downloads after the deadline, retries included
+                for index, _ in invalid:
+                    self.state.set_status(index, 'deferred')
+                    results.write({'doi': self.state.dois[index], 'success': False, 'filename': None,
+                                   'status': 'deferred'})
+                self.logger.warning(f"Deadline reached; {len(invalid)} invalid PDFs deferred to the next run")
+                break
+            self.logger.info(f"Re-queueing {len(invalid)} DOIs with invalid PDFs (retry {attempt + 1})")
+            retry_indices = [index for index, _ in invalid]
+            for index, future in bounded_submit(executor, self._download_index, retry_indices, window):
+                self._record(index, future.result(), results, validator)
+
+        self.writer.flush()
+        self._record_write_failures(results)
+
+        # Kept on disk, but flagged so they can be reviewed or dropped later
+        for index, report in validator.take_mismatched():
+            if self.state.get_status(index) != 'downloaded':
+                continue
+            self.state.set_status(index, 'doi_mismatch')
+            results.write({'doi': self.state.dois[index], 'success': True,
+                           'filename': str(Path(report['path']).relative_to(self.output_dir)),
+                           'status': 'doi_mismatch', 'reason': 'expected DOI not found on the first page'})
+
+        if self.leases is not None:
+            self._complete_leases()
+
+    def _revisit_claimed(self, executor, scheduler: DOIScheduler, window, results, validator):
+        """Keep re-trying DOIs other instances held until they are done somewhere or the deadline passes.
+
+        A lease held by a crashed instance expires after lease_seconds; the claim then succeeds here.
+        """
+        poll = min(self.leases.lease_seconds / 3, 30.0)
+        while not scheduler.expired():
+            waiting = [index for index in self.state.indices('claimed_elsewhere')
+                       if self.coordinator.status(self.state.dois[index]) is None]
+            if not waiting:
+                return
+            self.logger.info(f"{len(waiting)} DOIs are held by other instances; re-checking in {poll:.0f}s")
+            time.sleep(poll)
+            # They are counted again by whatever this attempt ends in
+            self.stats.incr('skipped', -len(waiting))
+            for index, future in bounded_submit(executor, self._download_index, waiting, window):
+                self._record(index, future.result(), results, validator)
+            self._settle(executor, scheduler, window, results, validator)
+
+    def _complete_leases(self):
+        held = self.leases.held()
+        for index, doi in enumerate(self.state.dois):
+            if doi not in held:
+                continue
+            status = self.state.get_status(index)
+            if status == 'deferred':
+                self.leases.release(doi)
+            else:
+                self._share_pdf_url(doi, status)
+                self.leases.complete(doi, status)
+
+    def _remember_pdf_url(self, normalized_doi: str, url: str):
+        # Not shared yet: a truncated file or an HTML page with a %PDF prefix must not become known_url
+        if self.coordinator is not None:
+            self._fetched_urls[doi_key(normalized_doi)] = url
+
+    def _share_pdf_url(self, doi: str, status: str):
+        """Publish the URL a validated PDF came from, so every instance tries it first."""
+        key = doi_key(self.normalize_doi(doi))
+        url = self._fetched_urls.pop(key, None)
+        if url and status == 'downloaded':
+            self.coordinator.put_resolved(key, url)
+
+    def _forget_pdf_url(self, doi: str):
+        """The file from this URL failed validation; drop it from the shared cache if it came from there."""
+        if self.coordinator is None:
+            return
+        key = doi_key(self.normalize_doi(doi))
+        url = self._fetched_urls.pop(key, None)
+        if url and self.coordinator.get_resolved(key) == url:
+            self.coordinator.forget_resolved(key)
+
+    def _observe_request(self, response=None, error: Exception = None):
+        """Feed the concurrency controller one request: its server time and status, or a timeout."""
+        if self.concurrency is None:
+            return
+        if isinstance(error, requests.Timeout):
+            self.concurrency.observe_request(30.0, timed_out=True)
+        elif response is not None and getattr(response, 'elapsed', None) is not None:
+            # elapsed covers the final hop up to its headers, not our rate-limit waits between redirects;
+            # fresh page-cache hits have no elapsed and made no request
+            self.concurrency.observe_request(response.elapsed.total_seconds(), response.status_code)
+
+    def _record(self, index: int, result: dict, results, validator: PDFValidationPool):
+        self.state.set_status(index, result['status'])
+        results.write(result)
+        if not result['success'] or not result['filename']:
+            return
+        path = self.output_dir / result['filename']
+        on_error = lambda error: self._write_failures.append((index, path, error))
+        # html_text_saved fallbacks are rendered by us, only fetched PDFs need checking
+        if result['status'] == 'downloaded':
+            expected_doi = self.normalize_doi(result['doi'])
+            self.writer.when_written(path, lambda: validator.submit(path, index, expected_doi), on_error)
+        else:
+            self.writer.when_written(path, lambda: None, on_error)
+
+    def _record_write_failures(self, results):
+        """Turn files the background writer could not write into 'failed' rows. Call after writer.flush()."""
+        failures, self._write_failures = self._write_failures, []
+        for index, path, error in failures:
+            self.logger.error(f"Could not write {path}: {error}")
+            self.state.set_status(index, 'failed')
+            self.stats.incr('success', -1)
+            self.stats.incr('failed')
+            results.write({'doi': self.state.dois[index], 'success': False, 'filename': None,
+                           'status': 'failed', 'reason': f'write failed: {error}'})
+
     def download_single_paper(self, doi: str) -> dict:
         normalized_doi = self.normalize_doi(doi)
         safe_filename = re.sub(r'[^\w\-_\.]', '_', normalized_doi)
+        filename = str(self.layout.relative_path(f"{safe_filename}.pdf"))
+
+        record = self.doi_metadata.get(doi_key(normalized_doi))
+        if record is not None and record.route == PAYWALLED and self.skip_paywalled:
+            self.stats.incr('skipped')
+            return {'doi': doi, 'success': False, 'filename': None, 'status': 'skipped_paywalled'}
+
+        # Fast path: open-access URL from prefetched metadata, then publisher-specific
+        # PDF URLs derived from the DOI, all without fetching the landing page
+        with self.profiler.stage('resolve'):
+            fast_candidates = resolve_pdf_urls(normalized_doi)
+            if record is not None and record.pdf_url:
+                fast_candidates.insert(0, record.pdf_url)
+            if self.coordinator is not None:
+                known_url = self.coordinator.get_resolved(doi_key(normalized_doi))
+                if known_url:
+                    fast_candidates.insert(0, known_url)
+        for pdf_link in fast_candidates:
+            if self.download_pdf_from_link(pdf_link, safe_filename):
+                self._remember_pdf_url(normalized_doi, pdf_link)
+                self.stats.incr('success')
+                return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
 
         download_urls = [
             f"https://doi.org/{normalized_doi}",
@@ -114,40 +401,59 @@ class SimpleDOIDownloader:
         for url in download_urls:
             try:
                 self.logger.info(f"Trying to download {doi} from {url}")
-                response = self.session.get(url, timeout=30, allow_redirects=True)
+                with self.profiler.stage('rate_wait', url):
+                    self.rate_limiter.wait(url)
+                with self.profiler.stage('fetch', url):
+                    response = self.page_cache.get(self.session, url, timeout=30, allow_redirects=True)
+                    content = response.content
+                self._observe_request(response)
 
                 if response.status_code == 200:
                     content_type = response.headers.get('content-type', '').lower()
 
-                    if 'pdf' in content_type and response.content.startswith(b'%PDF'):
-                        filename = f"{safe_filename}.pdf"
-                        filepath = self.output_dir / filename
-                        with open(filepath, 'wb') as f:
-                            f.write(response.content)
+                    if 'pdf' in content_type and content.startswith(b'%PDF'):
+                        with self.profiler.stage('write', url):
+                            self.writer.write(self.output_dir / filename, content)
+                        self._remember_pdf_url(normalized_doi, response.url)
+                        self.stats.incr('success')
                         return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
 
                     elif 'html' in content_type:
+                        with self.profiler.stage('resolve', response.url):
+                            fast_links = resolve_landing_pdf_urls(response.url, normalized_doi)
+                        for pdf_link in fast_links:
+                            if self.download_pdf_from_link(pdf_link, safe_filename):
+                                self._remember_pdf_url(normalized_doi, pdf_link)
+                                self.stats.incr('success')
+                                return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
+
                         html = response.text
-                        pdf_links = self.extract_pdf_links(html, url)
+                        with self.profiler.stage('parse', url):
+                            pdf_links = [link for link in self.extract_pdf_links(html, url) if link not in fast_links]
 
                         for pdf_link in pdf_links[:5]:
                             if self.download_pdf_from_link(pdf_link, safe_filename):
-                                filename = f"{safe_filename}.pdf"
+                                self._remember_pdf_url(normalized_doi, pdf_link)
+                                self.stats.incr('success')
                                 return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
 
-                        text = self.extract_text_content(html)
+                        with self.profiler.stage('parse', url):
+                            text = self.extract_text_content(html)
                         if len(text.strip()) > 500:
-                            fallback_name = f"{safe_filename}_htmlfallback.pdf"
-                            fallback_path = self.output_dir / fallback_name
-                            self.save_text_as_pdf(text, fallback_path)
+                            fallback_name = str(self.layout.relative_path(f"{safe_filename}_htmlfallback.pdf"))
+                            with self.profiler.stage('render', url):
+                                self.save_text_as_pdf(text, self.output_dir / fallback_name)
+                            self.stats.incr('success')
                             return {'doi': doi, 'success': True, 'filename': fallback_name, 'status': 'html_text_saved'}
 
-                time.sleep(2)
+                self.profiler.sleep(self.retry_delay)
 
             except Exception as e:
+                self._observe_request(error=e)
                 self.logger.warning(f"Error with {url}: {e}")
                 continue
 
+        self.stats.incr('failed')
         return {'doi': doi, 'success': False, 'filename': None, 'status': 'failed'}
 
     def extract_pdf_links(self, html_content: str, base_url: str) -> list:
@@ -161,6 +467,7 @@ class SimpleDOIDownloader:
             for match in matches:
                 pdf_links.add(self._resolve_link(base_url, match))
 
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_content, 'html.parser')
         fuzzy_keywords = ['download', 'get pdf', 'full text', 'open pdf', 'read article']
 
@@ -195,48 +502,55 @@ class SimpleDOIDownloader:
 
     def download_pdf_from_link(self, pdf_url: str, safe_filename: str) -> bool:
         try:
-            response = self.session.get(pdf_url, timeout=30)
-            if response.status_code == 200 and response.content.startswith(b'%PDF'):
-                filepath = self.output_dir / f"{safe_filename}.pdf"
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
+            with self.profiler.stage('rate_wait', pdf_url):
+                self.rate_limiter.wait(pdf_url)
+            with self.profiler.stage('candidate', pdf_url):
+                response = self.session.get(pdf_url, timeout=30)
+                content = response.content
+            self._observe_request(response)
+            if response.status_code == 200 and content.startswith(b'%PDF'):
+                with self.profiler.stage('write', pdf_url):
+                    self.writer.write(self.layout.path_for(f"{safe_filename}.pdf"), content)
                 return True
         except Exception as e:
+            self._observe_request(error=e)
             self.logger.debug(f"Failed to download from {pdf_url}: {e}")
         return False
 
     def extract_text_content(self, html: str) -> str:
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html, 'html.parser')
         for script in soup(['script', 'style']):
             script.decompose()
         return soup.get_text(separator='\n')
 
-   
-        
-        from fpdf import FPDF
-
-class UnicodePDF(FPDF):
-    def __init__(self):
-        super().__init__()
-        self.add_font("ArialUnicode", "", fname="arial-unicode-ms.ttf", uni=True)
-        self.set_font("ArialUnicode", size=10)
+    def save_text_as_pdf(self, text: str, filepath: Path):
+        """Render in the worker, hand the bytes to the background writer."""
+        self.writer.write(filepath, self.render_text_pdf(text))
 
-def save_text_as_pdf(self, text: str, filepath: Path):
-    pdf = UnicodePDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    for line in text.splitlines():
-        if line.strip():
-            pdf.multi_cell(0, 10, line.strip())
-    pdf.output(str(filepath))
+    def render_text_pdf(self, text: str) -> bytes:
+        from fpdf import FPDF
+        pdf = FPDF()
+        unicode_font = Path("arial-unicode-ms.ttf").exists()
+        if unicode_font:
+            pdf.add_font("ArialUnicode", "", fname="arial-unicode-ms.ttf", uni=True)
+            pdf.set_font("ArialUnicode", size=10)
+        else:
+            pdf.set_font("Arial", size=10)
+        pdf.add_page()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                if not unicode_font:
+                    # Core fonts are latin-1 only
+                    line = line.encode('latin-1', 'replace').decode('latin-1')
+                pdf.multi_cell(0, 10, line)
+        data = pdf.output(dest='S')
+        # PyFPDF returns a latin-1 str, fpdf2 a bytearray
+        return data.encode('latin-1') if isinstance(data, str) else bytes(data)
 
 
 if __name__ == "__main__":
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = f"~/Desktop/downloadedresearchpapers_{timestamp}"
-
-    downloader = SimpleDOIDownloader(
-        csv_file="/Users/vineetakhanna/Desktop/COMP 797 - vk/pubmed_doi.csv",  # 
-        output_dir=output_dir
-    )
-    downloader.run()
+    from download_papers import main
+    main(downloader_cls=SimpleDOIDownloader, engine='threads')
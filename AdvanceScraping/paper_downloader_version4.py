@@ -1,29 +1,33 @@
-import pandas as pd
 import requests
 from pathlib import Path
 import time
 import logging
 from urllib.parse import urlparse
 import re
-from tqdm import tqdm
-import json
 from datetime import datetime
-from bs4 import BeautifulSoup  # iframe detection
+
+from download_stats import StatsAggregator, ProgressReporter
+from results_sink import open_results_sink
+from page_cache import LandingPageCache
+from publisher_resolvers import resolve_pdf_urls, resolve_landing_pdf_urls
+from doi_metadata import prefetch_metadata, doi_key, PAYWALLED
+from doi_input import load_doi_list
+from rate_limit import HostRateLimiter
+from output_store import ShardedOutput, BackgroundWriter, setup_async_logging
 
 class SimpleDOIDownloader:
-    def __init__(self, csv_file: str, output_dir: str = "~/Desktop/downloadedresearchpapers209490"):
+    def __init__(self, csv_file: str, output_dir: str = "~/Desktop/downloadedresearchpapers209490",
+                 results_format: str = 'jsonl',
+                 page_cache_dir: str = "~/.cache/doi_downloader/pages",
+                 metadata_source=None, skip_paywalled: bool = False,
+                 per_host_rate: float = 1.0, retry_delay: float = 2.0, doi_delay: float = 1.0,
+                 shard_levels: int = 2):
         self.csv_file = csv_file
         self.output_dir = Path(output_dir).expanduser()
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.results_format = results_format
 
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(self.output_dir / 'download_log.txt'),
-                logging.StreamHandler()
-            ]
-        )
+        setup_async_logging(self.output_dir / 'download_log.txt')
         self.logger = logging.getLogger(__name__)
 
         self.session = requests.Session()
@@ -35,14 +39,22 @@ class SimpleDOIDownloader:
             'Connection': 'keep-alive',
         })
 
-        self.stats = {'total': 0, 'success': 0, 'failed': 0}
+        self.page_cache = LandingPageCache(page_cache_dir)
+        self.metadata_source = metadata_source
+        self.skip_paywalled = skip_paywalled
+        self.doi_metadata = {}
+        self.retry_delay = retry_delay
+        self.doi_delay = doi_delay
+        self.rate_limiter = HostRateLimiter(per_host_rate)
+        self.session.hooks['response'].append(self.rate_limiter.redirect_hook)
+        self.stats = StatsAggregator(keys=('success', 'failed', 'skipped'))
+        self.layout = ShardedOutput(self.output_dir, levels=shard_levels)
+        self.writer = BackgroundWriter()
+        self._write_failures = []
 
     def load_dois(self):
         try:
-            df = pd.read_csv(self.csv_file)
-            doi_columns = ['doi', 'DOI', 'Doi', 'doi_link', 'url', 'link']
-            doi_column = next((col for col in doi_columns if col in df.columns), df.columns[0])
-            dois = df[doi_column].dropna().tolist()
+            dois = load_doi_list(self.csv_file)
             self.logger.info(f"Loaded {len(dois)} DOI links from {self.csv_file}")
             return dois
         except Exception as e:
@@ -62,9 +74,25 @@ class SimpleDOIDownloader:
         normalized_doi = self.normalize_doi(doi)
         safe_filename = re.sub(r'[^\w\-_\.]', '_', normalized_doi)
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"{safe_filename}_{timestamp}.pdf"
+        filename = str(self.layout.relative_path(f"{safe_filename}_{timestamp}.pdf"))
         filepath = self.output_dir / filename
 
+        record = self.doi_metadata.get(doi_key(normalized_doi))
+        if record is not None and record.route == PAYWALLED and self.skip_paywalled:
+            self.stats.incr('skipped')
+            return {'doi': doi, 'success': False, 'filename': None, 'status': 'skipped_paywalled'}
+
+        # Fast path: open-access URL from prefetched metadata, then publisher-specific
+        # PDF URLs derived from the DOI, all without fetching the landing page
+        fast_candidates = resolve_pdf_urls(normalized_doi)
+        if record is not None and record.pdf_url:
+            fast_candidates.insert(0, record.pdf_url)
+        for pdf_link in fast_candidates:
+            if self.download_pdf_from_link(pdf_link, filepath):
+                self.stats.incr('success')
+                self.logger.info(f"Downloaded via publisher fast path: {filename}")
+                return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
+
         download_urls = [
             f"https://doi.org/{normalized_doi}",
             f"https://sci-hub.se/{normalized_doi}",
@@ -74,40 +102,46 @@ class SimpleDOIDownloader:
         for url in download_urls:
             try:
                 self.logger.info(f"Trying to download {doi} from {url}")
-                response = self.session.get(url, timeout=30, allow_redirects=True)
+                self.rate_limiter.wait(url)
+                response = self.page_cache.get(self.session, url, timeout=30, allow_redirects=True)
                 if response.status_code == 200:
                     content_type = response.headers.get('content-type', '').lower()
 
                     if 'pdf' in content_type and response.content.startswith(b'%PDF'):
-                        with open(filepath, 'wb') as f:
-                            f.write(response.content)
-                        self.stats['success'] += 1
+                        self.writer.write(filepath, response.content)
+                        self.stats.incr('success')
                         self.logger.info(f"Downloaded: {filename}")
                         return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
 
                     elif 'html' in content_type:
-                        pdf_links = self.extract_pdf_links(response.text, url)
+                        fast_links = resolve_landing_pdf_urls(response.url, normalized_doi)
+                        for pdf_link in fast_links:
+                            if self.download_pdf_from_link(pdf_link, filepath):
+                                self.stats.incr('success')
+                                self.logger.info(f"Downloaded via publisher fast path: {filename}")
+                                return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
+
+                        pdf_links = [link for link in self.extract_pdf_links(response.text, url) if link not in fast_links]
 
                         if not pdf_links:
                             self.logger.debug(f"No PDF links found in HTML for {doi}")
                             # Save HTML fallback for debugging
-                            html_path = self.output_dir / f"{safe_filename}_debug.html"
-                            with open(html_path, 'w', encoding='utf-8') as f:
-                                f.write(response.text)
+                            html_path = self.layout.path_for(f"{safe_filename}_debug.html")
+                            self.writer.write(html_path, response.text)
                             self.logger.info(f"Saved fallback HTML for inspection: {html_path}")
 
                         for pdf_link in pdf_links[:5]:
                             if self.download_pdf_from_link(pdf_link, filepath):
-                                self.stats['success'] += 1
+                                self.stats.incr('success')
                                 self.logger.info(f"Downloaded via link: {filename}")
                                 return {'doi': doi, 'success': True, 'filename': filename, 'status': 'downloaded'}
 
-                time.sleep(2)
+                time.sleep(self.retry_delay)
             except Exception as e:
                 self.logger.warning(f"Error with {url}: {e}")
                 continue
 
-        self.stats['failed'] += 1
+        self.stats.incr('failed')
         self.logger.warning(f"Failed to download: {doi}")
         return {'doi': doi, 'success': False, 'filename': None, 'status': 'failed'}
 
@@ -128,6 +162,7 @@ class SimpleDOIDownloader:
                 else:
                     pdf_links.append(base_url.rstrip('/') + '/' + match.lstrip('/'))
 
+        from bs4 import BeautifulSoup  # iframe detection
         soup = BeautifulSoup(html_content, 'html.parser')
         for tag in soup.find_all(['iframe', 'embed']):
             src = tag.get('src')
@@ -144,10 +179,10 @@ class SimpleDOIDownloader:
 
     def download_pdf_from_link(self, pdf_url: str, filepath: Path) -> bool:
         try:
+            self.rate_limiter.wait(pdf_url)
             response = self.session.get(pdf_url, timeout=30)
             if response.status_code == 200 and response.content.startswith(b'%PDF'):
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
+                self.writer.write(filepath, response.content)
                 return True
         except Exception as e:
             self.logger.debug(f"Failed to download from {pdf_url}: {e}")
@@ -159,38 +194,45 @@ class SimpleDOIDownloader:
         if not dois:
             return
 
-        self.stats['total'] = len(dois)
-        results = []
+        self.stats.total = len(dois)
+        if self.metadata_source is not None:
+            self.doi_metadata = prefetch_metadata([self.normalize_doi(doi) for doi in dois], self.metadata_source)
 
-        with tqdm(total=len(dois), desc="Downloading papers") as pbar:
+        from tqdm import tqdm
+        with open_results_sink(self.output_dir, self.results_format) as results, \
+                tqdm(total=len(dois), desc="Downloading papers") as pbar, ProgressReporter(self.stats, pbar):
             for doi in dois:
                 result = self.download_single_paper(doi)
-                results.append(result)
-                pbar.update(1)
-                pbar.set_postfix({
-                    'Success': self.stats['success'],
-                    'Failed': self.stats['failed'],
-                })
-                time.sleep(1)
-
-        results_file = self.output_dir / 'download_results.json'
-        with open(results_file, 'w') as f:
-            json.dump(results, f, indent=2)
-
+                results.write(result)
+                if result['success']:
+                    self.writer.when_written(self.output_dir / result['filename'], lambda: None,
+                                             lambda error, doi=doi: self._write_failures.append((doi, error)))
+                time.sleep(self.doi_delay)
+
+            # A row already says 'downloaded'; a later 'failed' row for the same DOI supersedes it
+            self.writer.flush()
+            for doi, error in self._write_failures:
+                self.logger.error(f"Could not write the file for {doi}: {error}")
+                self.stats.incr('success', -1)
+                self.stats.incr('failed')
+                results.write({'doi': doi, 'success': False, 'filename': None, 'status': 'failed',
+                               'reason': f'write failed: {error}'})
+
+        stats = self.stats.snapshot()
         self.logger.info("=" * 50)
         self.logger.info("DOWNLOAD SUMMARY")
         self.logger.info("=" * 50)
-        self.logger.info(f"Total DOIs: {self.stats['total']}")
-        self.logger.info(f"Successfully downloaded: {self.stats['success']}")
-        self.logger.info(f"Failed: {self.stats['failed']}")
-        success_rate = (self.stats['success'] / self.stats['total'] * 100) if self.stats['total'] > 0 else 0
+        self.logger.info(f"Total DOIs: {stats['total']}")
+        self.logger.info(f"Successfully downloaded: {stats['success']}")
+        self.logger.info(f"Failed: {stats['failed']}")
+        self.logger.info(f"Skipped (paywalled): {stats['skipped']}")
+        success_rate = (stats['success'] / stats['total'] * 100) if stats['total'] > 0 else 0
         self.logger.info(f"Success rate: {success_rate:.1f}%")
+        self.logger.info(f"Landing pages: {self.page_cache.revalidated} revalidated (304), "
+                         f"{self.page_cache.hits} fresh hits, {self.page_cache.misses} fetched")
         self.logger.info("=" * 50)
 
 
 if __name__ == "__main__":
-    downloader = SimpleDOIDownloader(
-        csv_file="/Users/vineetakhanna/Desktop/COMP 797 - vk/pubmed_doi.csv",
-        output_dir="~/Desktop/downloadedresearchpapers200903"
-    )
-    downloader.run()
+    from download_papers import main
+    main(downloader_cls=SimpleDOIDownloader, engine='sequential')
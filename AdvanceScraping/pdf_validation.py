@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+TRAILER_WINDOW = 2048
+# Permission-only encryption is common on real articles; tiny encrypted files are DRM/login stubs
+ENCRYPTED_STUB_BYTES = 16 * 1024
+PAGE_PATTERN = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+STARTXREF_PATTERN = re.compile(rb'startxref\s+(\d+)\s+%%EOF', re.DOTALL)
+# Readers tolerate a startxref that is a few bytes off (CRLF rewrites, leading whitespace)
+XREF_SLACK = 64
+XREF_PATTERN = re.compile(rb'xref|\d+\s+\d+\s+obj')
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', '', text).lower()
+
+
+def _first_page(path: Path):
+    """(page count, first page text) via pypdf when it is installed, else (None, None)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None, None
+    reader = PdfReader(str(path))
+    pages = len(reader.pages)
+    text = reader.pages[0].extract_text() if pages else ''
+    return pages, text or ''
+
+
+def validate_pdf(path: str, expected_doi: str = None, check_text: bool = False) -> dict:
+    """Structural checks on a downloaded PDF. Runs in a worker process, so it only takes plain args.
+
+    Catches the usual garbage: truncated transfers (no %%EOF / bad startxref),
+    HTML error pages that happen to start with %PDF, small encrypted stubs and
+    zero-page files. A startxref that points nowhere near an xref section only
+    marks the file 'suspect', since readers rebuild broken xref tables. With
+    check_text the first page is extracted and the expected DOI looked for in it.
+    """
+    path = Path(path)
+    result = {'path': str(path), 'doi': expected_doi, 'valid': False, 'reason': None, 'pages': None,
+              'suspect': None}
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        result['reason'] = f'unreadable: {e}'
+        return result
+    size = len(data)
+    head, tail = data[:TRAILER_WINDOW], data[-TRAILER_WINDOW:]
+
+    if not head.startswith(b'%PDF-'):
+        result['reason'] = 'missing %PDF header'
+        return result
+    if b'<html' in head.lower() or b'<!doctype html' in head.lower():
+        result['reason'] = 'html body with pdf prefix'
+        return result
+    if b'%%EOF' not in tail:
+        result['reason'] = 'missing %%EOF trailer (truncated?)'
+        return result
+
+    match = None
+    for match in STARTXREF_PATTERN.finditer(tail):
+        pass
+    if match is None:
+        result['reason'] = 'missing startxref'
+        return result
+    offset = int(match.group(1))
+    # Classic xref table or a cross-reference stream object ("12 0 obj") at or near the offset
+    if offset >= size or not XREF_PATTERN.search(data, max(0, offset - XREF_SLACK), offset + XREF_SLACK):
+        result['suspect'] = 'startxref does not point at an xref section'
+    if b'/Encrypt' in data and size < ENCRYPTED_STUB_BYTES:
+        result['reason'] = 'encrypted stub'
+        return result
+
+    # Object streams can hide /Type /Page from the regex, so this count is only a hint
+    result['pages'] = len(PAGE_PATTERN.findall(data))
+    if check_text:
+        try:
+            pages, text = _first_page(path)
+        except Exception as e:
+            result['reason'] = f'unparseable: {e}'
+            return result
+        if pages is not None:
+            result['pages'] = pages
+            if pages == 0:
+                result['reason'] = 'no pages'
+                return result
+            result['first_page_text'] = text[:500]
+            # Scanned PDFs have no text layer; that says nothing about the DOI
+            if expected_doi and text.strip():
+                result['doi_on_first_page'] = _normalize(expected_doi) in _normalize(text)
+
+    result['valid'] = True
+    return result
+
+
+class PDFValidationPool:
+    """Validates finished downloads in a process pool, off the download path.
+
+    submit() returns immediately; invalid files are removed from disk and their
+    keys collected so the caller can queue them for another download attempt.
+    Valid files whose first page does not show the expected DOI are kept but
+    collected separately (take_mismatched) so the caller can record them.
+    """
+
+    def __init__(self, max_workers: int = None, check_text: bool = False, logger=None):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers or max(1, (os.cpu_count() or 2) - 1))
+        self.check_text = check_text
+        self.logger = logger
+        self._pending = 0
+        self._lock = threading.Condition()
+        self.invalid = []
+        self.mismatched = []
+        self.valid_count = 0
+
+    def submit(self, path, key, expected_doi: str = None):
+        """key is handed back with the report by take_invalid() (a DOI, a row index, ...)."""
+        future = self.executor.submit(validate_pdf, str(path), expected_doi, self.check_text)
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(lambda f, key=key: self._done(key, f))
+
+    def _done(self, key, future):
+        try:
+            report = future.result()
+        except Exception as e:
+            report = {'valid': False, 'reason': f'validator crashed: {e}', 'path': None}
+        if not report['valid']:
+            if self.logger:
+                self.logger.warning(f"Invalid PDF for {report.get('doi') or key}: {report['reason']}")
+            if report.get('path'):
+                Path(report['path']).unlink(missing_ok=True)
+        elif report.get('suspect') and self.logger:
+            self.logger.warning(f"Keeping suspect PDF for {report.get('doi') or key}: {report['suspect']}")
+        with self._lock:
+            if report['valid']:
+                self.valid_count += 1
+                if report.get('doi_on_first_page') is False:
+                    self.mismatched.append((key, report))
+            else:
+                self.invalid.append((key, report))
+            self._pending -= 1
+            self._lock.notify_all()
+
+    def wait(self):
+        with self._lock:
+            self._lock.wait_for(lambda: self._pending == 0)
+
+    def take_invalid(self) -> list:
+        self.wait()
+        with self._lock:
+            invalid, self.invalid = self.invalid, []
+        return invalid
+
+    def take_mismatched(self) -> list:
+        self.wait()
+        with self._lock:
+            mismatched, self.mismatched = self.mismatched, []
+        return mismatched
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
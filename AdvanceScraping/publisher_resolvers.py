@@ -0,0 +1,132 @@
+import re
+from urllib.parse import urlparse
+
+# DOI prefix -> resolver(doi) and landing host -> resolver(landing_url, doi).
+# Each resolver returns candidate PDF URLs, best first; an empty list means
+# "no idea", and the caller falls back to scraping the landing page.
+PREFIX_RESOLVERS = {}
+HOST_RESOLVERS = {}
+
+PMC_ID = re.compile(r'^PMC\d+$', re.IGNORECASE)
+
+
+def register_prefix(*prefixes):
+    def decorator(func):
+        for prefix in prefixes:
+            PREFIX_RESOLVERS[prefix] = func
+        return func
+    return decorator
+
+
+def register_host(*hosts):
+    def decorator(func):
+        for host in hosts:
+            HOST_RESOLVERS[host] = func
+        return func
+    return decorator
+
+
+def doi_prefix(doi: str) -> str:
+    return doi.split('/', 1)[0]
+
+
+def host_key(doi: str) -> str:
+    """Rough guess at which server a DOI will end up on, for spreading load before any request."""
+    doi = doi.strip()
+    return 'pmc' if PMC_ID.match(doi) else doi_prefix(doi).lower()
+
+
+def resolve_pdf_urls(doi: str) -> list:
+    """Candidate PDF URLs derived from the DOI (or PMC ID) alone, no network needed."""
+    doi = doi.strip()
+    if PMC_ID.match(doi):
+        return pmc_pdf_urls(doi.upper())
+    resolver = PREFIX_RESOLVERS.get(doi_prefix(doi))
+    return resolver(doi) if resolver else []
+
+
+def resolve_landing_pdf_urls(landing_url: str, doi: str = '') -> list:
+    """Candidate PDF URLs derived from the URL doi.org redirected to."""
+    host = urlparse(landing_url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    resolver = HOST_RESOLVERS.get(host)
+    return resolver(landing_url, doi) if resolver else []
+
+
+def pmc_pdf_urls(pmcid: str) -> list:
+    return [
+        f"https://europepmc.org/articles/{pmcid}?pdf=render",
+        f"https://www.ncbi.nlm.nih.gov/pmc/articles/{pmcid}/pdf/",
+    ]
+
+
+PLOS_JOURNALS = {
+    'pone': 'plosone',
+    'pbio': 'plosbiology',
+    'pmed': 'plosmedicine',
+    'pcbi': 'ploscompbiol',
+    'pgen': 'plosgenetics',
+    'ppat': 'plospathogens',
+    'pntd': 'plosntds',
+    'pclm': 'climate',
+    'pgph': 'globalpublichealth',
+    'pdig': 'digitalhealth',
+    'pwat': 'water',
+}
+
+
+@register_prefix('10.1371')
+def plos(doi: str) -> list:
+    match = re.match(r'10\.1371/journal\.([a-z]+)\.', doi, re.IGNORECASE)
+    if not match or match.group(1).lower() not in PLOS_JOURNALS:
+        return []
+    journal = PLOS_JOURNALS[match.group(1).lower()]
+    return [f"https://journals.plos.org/{journal}/article/file?id={doi}&type=printable"]
+
+
+@register_prefix('10.1007', '10.1186', '10.1038')
+def springer_nature(doi: str) -> list:
+    urls = [f"https://link.springer.com/content/pdf/{doi}.pdf"]
+    if doi.startswith('10.1038/'):
+        urls.insert(0, f"https://www.nature.com/articles/{doi.split('/', 1)[1]}.pdf")
+    return urls
+
+
+@register_prefix('10.1002', '10.1111')
+def wiley(doi: str) -> list:
+    return [f"https://onlinelibrary.wiley.com/doi/pdfdirect/{doi}"]
+
+
+@register_prefix('10.1021')
+def acs(doi: str) -> list:
+    return [f"https://pubs.acs.org/doi/pdf/{doi}"]
+
+
+@register_prefix('10.3389')
+def frontiers(doi: str) -> list:
+    return [f"https://www.frontiersin.org/articles/{doi}/pdf"]
+
+
+@register_host('linkinghub.elsevier.com', 'sciencedirect.com')
+def elsevier(landing_url: str, doi: str) -> list:
+    # Elsevier DOIs (10.1016) carry no PII, so we need the doi.org redirect target first
+    match = re.search(r'/pii/(S?[0-9X]+)', landing_url, re.IGNORECASE)
+    if not match:
+        return []
+    pii = match.group(1)
+    return [f"https://www.sciencedirect.com/science/article/pii/{pii}/pdfft?isDTMRedir=true&download=true"]
+
+
+@register_host('mdpi.com')
+def mdpi(landing_url: str, doi: str) -> list:
+    base = landing_url.split('?', 1)[0].rstrip('/')
+    if base.endswith('/htm'):
+        base = base[:-4]
+    return [base + '/pdf']
+
+
+@register_host('ncbi.nlm.nih.gov', 'pmc.ncbi.nlm.nih.gov', 'europepmc.org')
+def pmc(landing_url: str, doi: str) -> list:
+    match = re.search(r'(PMC\d+)', landing_url, re.IGNORECASE)
+    return pmc_pdf_urls(match.group(1).upper()) if match else []
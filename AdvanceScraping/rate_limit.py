@@ -0,0 +1,46 @@
+import threading
+import time
+from urllib.parse import urljoin, urlparse
+
+# DOI resolvers only answer with a redirect; every DOI starts there, so budgeting them
+# per host would cap the whole run at per_host_rate DOIs/s. The publisher they
+# redirect to is limited instead, through redirect_hook.
+RESOLVER_HOSTS = frozenset({'doi.org', 'dx.doi.org'})
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host so that each host sees at most `rate` requests per second.
+
+    Workers reserve the next free slot for a host under a short lock and then
+    sleep outside it, so waiting on a slow host never blocks other hosts.
+    Install redirect_hook on the session so redirects wait for the host they
+    land on, not just the one the request started at.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, host: str) -> float:
+        """Book the next slot for host; returns how long to sleep before using it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval
+        return slot - now
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc.lower()
+        if host in RESOLVER_HOSTS:
+            return
+        delay = self._reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def redirect_hook(self, response, **kwargs):
+        """requests response hook: before following a redirect, wait for the host it points at."""
+        if response.is_redirect:
+            self.wait(urljoin(response.url, response.headers['location']))
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+
+class DOIProfile:
+    """Timeline of one download_single_paper() call: (stage, seconds, url) per step."""
+
+    __slots__ = ('doi', 'started', 'steps')
+
+    def __init__(self, doi: str):
+        self.doi = doi
+        self.started = time.perf_counter()
+        self.steps = []
+
+    def add(self, stage: str, seconds: float, url: str = None):
+        self.steps.append((stage, seconds, url))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def breakdown(self) -> dict:
+        totals = {}
+        for stage, seconds, _ in self.steps:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+
+class RequestProfiler:
+    """Opt-in per-DOI stage timing with a slow-request log.
+
+    Workers call begin(doi) / end(status) around a download and wrap each step
+    in `with profiler.stage('fetch', url):` (resolve, rate_wait, fetch, parse,
+    candidate, write, render, sleep in the downloader). The profile in progress is kept
+    per thread, so helpers deep in the call chain need no extra argument. DOIs
+    that take longer than `threshold` seconds get their full timeline appended
+    to `slow_log` as one JSON line; every DOI feeds the per-stage totals.
+    A disabled profiler (threshold None) turns stage() into a no-op.
+    """
+
+    def __init__(self, slow_log=None, threshold: float = None):
+        self.enabled = threshold is not None
+        self.threshold = threshold
+        self.slow_log = Path(slow_log).expanduser() if slow_log else None
+        self.slow_count = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def begin(self, doi: str):
+        if self.enabled:
+            self._local.profile = DOIProfile(doi)
+
+    def current(self):
+        return getattr(self._local, 'profile', None)
+
+    def stage(self, name: str, url: str = None):
+        if not self.enabled or self.current() is None:
+            return nullcontext()
+        return self._timed(name, url)
+
+    @contextmanager
+    def _timed(self, name, url):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current().add(name, time.perf_counter() - start, url)
+
+    def sleep(self, seconds: float):
+        with self.stage('sleep'):
+            time.sleep(seconds)
+
+    def end(self, status: str):
+        profile = self.current()
+        if profile is None:
+            return
+        self._local.profile = None
+        elapsed = profile.elapsed()
+        breakdown = profile.breakdown()
+        slow = elapsed >= self.threshold
+        with self._lock:
+            for stage, seconds in breakdown.items():
+                self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+            self._totals['total'] = self._totals.get('total', 0.0) + elapsed
+            if slow:
+                self.slow_count += 1
+                if self.slow_log is not None:
+                    entry = {
+                        'doi': profile.doi,
+                        'status': status,
+                        'seconds': round(elapsed, 3),
+                        # Time not covered by any stage: bookkeeping, logging, lock waits
+                        'unaccounted': round(elapsed - sum(breakdown.values()), 3),
+                        'stages': {stage: round(seconds, 3) for stage, seconds in breakdown.items()},
+                        'steps': [{'stage': stage, 'seconds': round(seconds, 3), 'url': url}
+                                  for stage, seconds, url in profile.steps],
+                    }
+                    with open(self.slow_log, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry) + '\n')
+
+    def totals(self) -> dict:
+        with self._lock:
+            return dict(self._totals)
@@ -0,0 +1,178 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+class ResultsSink(ABC):
+    """Streams per-DOI result dicts to disk as they complete.
+
+    Rows are buffered and flushed every `flush_every` rows or `flush_interval`
+    seconds, whichever comes first. On each flush a small summary index
+    (DOIs per latest status, rows written, last update) is rewritten atomically
+    so dashboards can poll it while the run is still going. A DOI that was
+    retried counts once, under its last row's status. Both formats append to an
+    existing results file, and the summary counts cover the whole file.
+    """
+
+    def __init__(self, path, summary_path=None, flush_every: int = 100, flush_interval: float = 5.0):
+        self.path = Path(path)
+        self.summary_path = Path(summary_path) if summary_path else self.path.with_name('download_summary.json')
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.status_counts = {}
+        self._latest = {}
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._started = time.time()
+
+    def _count(self, row: dict):
+        status = row.get('status', 'unknown')
+        previous = self._latest.get(row.get('doi'))
+        if previous is not None:
+            self.status_counts[previous] -= 1
+            if not self.status_counts[previous]:
+                del self.status_counts[previous]
+        self._latest[row.get('doi')] = status
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def _count_existing(self, rows):
+        for row in rows:
+            self._count(row)
+            self.rows_written += 1
+
+    def write(self, result: dict):
+        self._buffer.append(result)
+        self._count(result)
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+        self._write_summary()
+        self._last_flush = time.monotonic()
+
+    @abstractmethod
+    def _write_rows(self, rows: list):
+        raise NotImplementedError
+
+    def _write_summary(self, final: bool = False):
+        summary = {
+            'results_file': self.path.name,
+            'rows': self.rows_written,
+            'dois': len(self._latest),
+            'status_counts': self.status_counts,
+            'started_at': self._started,
+            'updated_at': time.time(),
+            'finished': final,
+        }
+        tmp = self.summary_path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp, self.summary_path)
+
+    def close(self):
+        self.flush()
+        self._write_summary(final=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JSONLResultsSink(ResultsSink):
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        if self.path.exists():
+            self._count_existing(read_results(self.path))
+        self._fh = open(self.path, 'a', encoding='utf-8')
+
+    def _write_rows(self, rows: list):
+        self._fh.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self._fh.flush()
+
+    def close(self):
+        super().close()
+        self._fh.close()
+
+
+class ParquetResultsSink(ResultsSink):
+    """Writes each flush as one Parquet row group. Needs pyarrow.
+
+    A Parquet file cannot be reopened for appending, so the rows of an existing
+    file are copied into a temp file first, and the temp file replaces the
+    original on close. If the run dies, the previous file is left as it was.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = pa.schema([
+            ('doi', pa.string()),
+            ('success', pa.bool_()),
+            ('filename', pa.string()),
+            ('status', pa.string()),
+            ('reason', pa.string()),
+        ])
+        self._tmp = self.path.with_name(self.path.name + '.tmp')
+        self._writer = pq.ParquetWriter(str(self._tmp), self._schema)
+        if self.path.exists():
+            # One row group at a time, so a long history is never held in memory at once
+            for batch in pq.ParquetFile(str(self.path)).iter_batches():
+                existing = batch.to_pylist()
+                self._count_existing(existing)
+                self._write_rows(existing)
+
+    def _write_rows(self, rows: list):
+        columns = {name: [row.get(name) for row in rows] for name in self._schema.names}
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+        os.replace(self._tmp, self.path)
+
+
+def open_results_sink(output_dir, fmt: str = 'jsonl', **kwargs) -> ResultsSink:
+    output_dir = Path(output_dir)
+    if fmt == 'parquet':
+        return ParquetResultsSink(output_dir / 'download_results.parquet', **kwargs)
+    return JSONLResultsSink(output_dir / 'download_results.jsonl', **kwargs)
+
+
+RESULTS_FILES = ('download_results.parquet', 'download_results.jsonl')
+
+
+def read_results(path):
+    """Yield the rows of a JSONL or Parquet results file as dicts (e.g. for post-processing).
+
+    Streams the file, so a long results history costs one row (one batch for
+    Parquet) of memory; wrap it in list() to keep them all.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(str(path)).iter_batches():
+            yield from batch.to_pylist()
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_results(output_dir):
+    """Yield every results row in output_dir, whichever format(s) earlier runs wrote."""
+    for name in RESULTS_FILES:
+        path = Path(output_dir) / name
+        if path.exists():
+            yield from read_results(path)
@@ -0,0 +1,140 @@
+import time
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from doi_state import concurrency_limit
+
+# Lower runs first
+PRIORITY_FAST = 0      # cached landing page, known open access, or a publisher fast path
+PRIORITY_NEW = 1
+PRIORITY_RETRY = 2     # failed in an earlier run
+PRIORITY_NAMES = {PRIORITY_FAST: 'fast', PRIORITY_NEW: 'new', PRIORITY_RETRY: 'retry'}
+
+
+class _HostQueue:
+    """FIFO of row indices backed by a typed array (4 bytes per entry, not a Python int each)."""
+
+    __slots__ = ('items', 'head')
+
+    def __init__(self):
+        self.items = array('I')
+        self.head = 0
+
+    def push(self, index: int):
+        self.items.append(index)
+
+    def pop(self) -> int:
+        index = self.items[self.head]
+        self.head += 1
+        if self.head == len(self.items):
+            self.items = array('I')
+            self.head = 0
+        return index
+
+    def __len__(self):
+        return len(self.items) - self.head
+
+
+class DOIScheduler:
+    """Hands out DOI row indices by priority class, round-robin across hosts within a class.
+
+    At most max_per_host tasks per host are in flight while other hosts have
+    work waiting, so one slow publisher cannot occupy every worker; when only
+    capped hosts have anything queued, the cap is lifted rather than leaving
+    workers idle. Once the deadline passes nothing new is handed out; whatever
+    is still queued can be collected with drain().
+    """
+
+    def __init__(self, max_per_host: int = 2, deadline: float = None):
+        self.max_per_host = max_per_host
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self._classes = {}
+        self._rotations = {}
+        self._in_flight = {}
+        self._host_of = {}
+        self._size = 0
+
+    def push(self, index: int, host: str, priority: int = PRIORITY_NEW):
+        hosts = self._classes.setdefault(priority, {})
+        queue = hosts.get(host)
+        if queue is None:
+            queue = hosts[host] = _HostQueue()
+            self._rotations.setdefault(priority, deque()).append(host)
+        queue.push(index)
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def pop(self):
+        """Next index to start, or None if nothing is runnable right now."""
+        if self.expired():
+            return None
+        overflow = None
+        for priority in sorted(self._classes):
+            hosts = self._classes[priority]
+            rotation = self._rotations[priority]
+            for _ in range(len(rotation)):
+                host = rotation[0]
+                rotation.rotate(-1)
+                queue = hosts[host]
+                if not queue:
+                    del hosts[host]
+                    rotation.remove(host)
+                    continue
+                if self._in_flight.get(host, 0) >= self.max_per_host:
+                    if overflow is None:
+                        overflow = (host, queue)
+                    continue
+                return self._take(host, queue)
+        # Nothing runnable under the cap: better a third request to a busy host than an idle worker
+        return self._take(*overflow) if overflow is not None else None
+
+    def _take(self, host: str, queue: _HostQueue) -> int:
+        index = queue.pop()
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        self._host_of[index] = host
+        self._size -= 1
+        return index
+
+    def done(self, index: int):
+        host = self._host_of.pop(index)
+        self._in_flight[host] -= 1
+
+    def drain(self):
+        """Remove and yield every index still queued (e.g. after the deadline)."""
+        for hosts in self._classes.values():
+            for queue in hosts.values():
+                while queue:
+                    self._size -= 1
+                    yield queue.pop()
+        self._classes.clear()
+        self._rotations.clear()
+
+
+def scheduled_submit(executor, fn, scheduler: DOIScheduler, window):
+    """bounded_submit() driven by a DOIScheduler: yields (index, future) as tasks finish."""
+    controller = concurrency_limit(window)
+    in_flight = {}
+
+    def fill():
+        while len(in_flight) < controller.limit:
+            index = scheduler.pop()
+            if index is None:
+                return
+            controller.task_started()
+            in_flight[executor.submit(fn, index)] = (index, time.monotonic())
+
+    fill()
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, started = in_flight.pop(future)
+            scheduler.done(index)
+            controller.task_done(time.monotonic() - started)
+            yield index, future
+        fill()
@@ -0,0 +1,54 @@
+import re
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('tqdm')
+
+from coordination import SQLiteCoordinator
+from download_papers import load_engine
+
+
+def minimal_pdf() -> bytes:
+    body = b"%PDF-1.4\n1 0 obj\n<< /Type /Page >>\nendobj\n"
+    return body + b"xref\n0 1\n0000000000 65535 f \ntrailer\n<< /Size 1 >>\nstartxref\n%d\n%%%%EOF\n" % len(body)
+
+
+def fake_download(self, doi):
+    """Stands in for the network: a short fetch, then a valid PDF through the background writer."""
+    safe_filename = re.sub(r'[^\w\-_\.]', '_', self.normalize_doi(doi))
+    time.sleep(0.05)
+    self.writer.write(self.layout.path_for(f"{safe_filename}.pdf"), minimal_pdf())
+    self.stats.incr('success')
+    return {'doi': doi, 'success': True, 'filename': str(self.layout.relative_path(f"{safe_filename}.pdf")),
+            'status': 'downloaded'}
+
+
+def test_two_instances_splitting_one_list_both_finish(tmp_path, monkeypatch):
+    # Each instance ends its main pass holding fetched-but-unvalidated DOIs the other is waiting for;
+    # neither may wait on the other before completing its own
+    dois = [f"10.1000/test{i}" for i in range(12)]
+    doi_file = tmp_path / 'dois.txt'
+    doi_file.write_text('\n'.join(dois) + '\n')
+    downloader_cls = load_engine('threads')
+    monkeypatch.setattr(downloader_cls, 'download_single_paper', fake_download)
+
+    instances = []
+    for name in ('a', 'b'):
+        downloader = downloader_cls(str(doi_file), str(tmp_path / name), page_cache_dir=str(tmp_path / 'pages'),
+                                    coordinator=SQLiteCoordinator(str(tmp_path / 'coordination.sqlite3')),
+                                    worker_id=name, max_workers=2, adaptive=False)
+        downloader.leases.lease_seconds = 3
+        instances.append(downloader)
+
+    threads = [threading.Thread(target=downloader.run, daemon=True) for downloader in instances]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads), "instances are waiting on each other"
+
+    coordinator = SQLiteCoordinator(str(tmp_path / 'coordination.sqlite3'))
+    assert {doi: coordinator.status(doi) for doi in dois} == {doi: 'downloaded' for doi in dois}
@@ -1,5 +1,6 @@
 import pandas as pd
 from Bio import Entrez, Medline
+from datetime import datetime
 from time import sleep
 from tqdm import tqdm
 
@@ -26,28 +27,94 @@ def fetch_citation_count(pmid):
     except:
         return 0
 
-# Fetch all matching articles
-def fetch_full_pubmed_papers(journal_query, keywords, start_year=2015):
-    keyword_query = " OR ".join([f'"{kw}"[All Fields]' for kw in keywords])
-    query = f'("{journal_query}"[Journal]) AND ({keyword_query}) AND ("{start_year}"[PDAT] : "3000"[PDAT])'
+# Longest term we send to esearch; Entrez switches to POST for long queries, but
+# NCBI still rejects very long terms, so stay well under it
+MAX_QUERY_LENGTH = 4000
 
-    try:
-        # Get search count
-        search_handle = Entrez.esearch(db="pubmed", term=query, usehistory="y", retmax=0)
-        search_results = Entrez.read(search_handle)
-        search_handle.close()
 
-        count = int(search_results["Count"])
-        if count == 0:
-            return []
+def issn_variants(raw_issns):
+    """'12345678, 2345-6789' -> ['12345678', '1234-5678', '2345-6789']"""
+    variants = []
+    for issn in str(raw_issns).replace(" ", "").split(","):
+        if not issn:
+            continue
+        variants.append(issn)
+        if len(issn) == 8:
+            variants.append(issn[:4] + '-' + issn[4:])
+    return variants
+
+
+def build_journal_terms(journal_info):
+    """One row per journal -> (journal key, [search terms]) plus a term -> journal key lookup.
+
+    Abbreviation and every ISSN form go into the same OR group instead of being
+    tried one request at a time, and the lookup maps PMIDs back to the input row.
+    """
+    abbrevs = journal_info['PubMed Abbreviation'].astype(str).str.strip()
+    issns = journal_info['Issn'].astype(str).map(issn_variants)
 
-        webenv = search_results["WebEnv"]
-        query_key = search_results["QueryKey"]
+    journals = []
+    lookup = {}
+    for abbrev, variants in zip(abbrevs, issns):
+        terms = list(dict.fromkeys([abbrev] + variants))
+        journals.append((abbrev, terms))
+        for term in terms:
+            lookup.setdefault(term.lower(), abbrev)
+    return journals, lookup
 
-        all_papers = []
-        batch_size = 200
 
-        for start in range(0, count, batch_size):
+def build_query(clauses, keywords, start_year=2015, end_year=3000):
+    keyword_query = " OR ".join([f'"{kw}"[All Fields]' for kw in keywords])
+    return f'({" OR ".join(clauses)}) AND ({keyword_query}) AND ("{start_year}"[PDAT] : "{end_year}"[PDAT])'
+
+
+def plan_queries(journals, keywords, start_year=2015, max_length=MAX_QUERY_LENGTH):
+    """Pack journals into as few OR'd clause groups as fit in one esearch term under max_length."""
+    overhead = len(build_query([], keywords, start_year))
+    groups = []
+    clauses = []
+    length = overhead
+    for _, terms in journals:
+        clause = " OR ".join(f'"{term}"[Journal]' for term in terms)
+        added = len(clause) + (4 if clauses else 0)
+        if clauses and length + added > max_length:
+            groups.append(clauses)
+            clauses, length = [], overhead
+            added = len(clause)
+        clauses.append(clause)
+        length += added
+    if clauses:
+        groups.append(clauses)
+    return groups
+
+
+def match_journal(record, journal_lookup):
+    """Which input journal a Medline record came from: by abbreviation, then by any of its ISSNs."""
+    abbrev = record.get("TA", "").lower()
+    if abbrev in journal_lookup:
+        return journal_lookup[abbrev]
+    for issn in record.get("IS", "").split():
+        if issn.lower() in journal_lookup:
+            return journal_lookup[issn.lower()]
+    return ""
+
+
+# PubMed will not page past this many results of one search (retstart limit)
+PUBMED_MAX_RESULTS = 9999
+
+
+def search_pubmed(query):
+    """(count, webenv, query_key) for query, keeping the result set on the history server."""
+    search_handle = Entrez.esearch(db="pubmed", term=query, usehistory="y", retmax=0)
+    search_results = Entrez.read(search_handle)
+    search_handle.close()
+    return int(search_results["Count"]), search_results["WebEnv"], search_results["QueryKey"]
+
+
+def fetch_batch(webenv, query_key, start, batch_size, attempts=3):
+    """One efetch page, fully parsed, retried a few times before giving up."""
+    for attempt in range(attempts):
+        try:
             fetch_handle = Entrez.efetch(
                 db="pubmed",
                 rettype="medline",
@@ -57,71 +124,105 @@ def fetch_full_pubmed_papers(journal_query, keywords, start_year=2015):
                 webenv=webenv,
                 query_key=query_key
             )
-            records = Medline.parse(fetch_handle)
-
-            for record in records:
-                pmid = record.get("PMID", "")
-                authors = "; ".join(record.get("AU", []))
-                title = record.get("TI", "")
-                journal = record.get("JT", "")
-                pub_date = record.get("DP", "")
-                abstract = record.get("AB", "")
-                citation_count = fetch_citation_count(pmid)
-                pubmed_url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-
-                all_papers.append({
-                    "Title": title,
-                    "Authors": authors,
-                    "Journal": journal,
-                    "Publication Date": pub_date,
-                    "Abstract": abstract,
-                    "Citations Count": citation_count,
-                    "PubMed URL": pubmed_url
-                })
-
+            records = list(Medline.parse(fetch_handle))
             fetch_handle.close()
-            sleep(1)
-
-        return all_papers
-    except Exception as e:
-        print(f"❗ Error for {journal_query}: {e}")
-        return []
+            return records
+        except Exception as e:
+            print(f"❗ Batch at {start} failed (attempt {attempt + 1}/{attempts}): {e}")
+            sleep(5 * (attempt + 1))
+    return None
 
-# Run full extraction with ISSN fallback (now handles multiple ISSNs)
-all_results = []
 
-for index, row in tqdm(journal_info.iterrows(), total=len(journal_info), desc="Fetching Full Metadata from PubMed"):
-    abbrev = str(row['PubMed Abbreviation']).strip()
-    raw_issns = str(row['Issn']).strip().replace(" ", "")  # remove whitespace
-    issn_list = [issn.strip() for issn in raw_issns.split(",") if issn.strip()]
-
-    print(f"\n🔍 Searching with Abbreviation: {abbrev}")
-    papers = fetch_full_pubmed_papers(abbrev, keywords, start_year=2015)
-
-    # If abbreviation fails, go through each ISSN variant
-    if not papers:
-        for issn in issn_list:
-            print(f"⚠️ No results with abbreviation. Trying raw ISSN: {issn}")
-            papers = fetch_full_pubmed_papers(issn, keywords, start_year=2015)
+# Fetch all matching articles
+def fetch_full_pubmed_papers(query, journal_lookup, seen_pmids, search=None):
+    """Fetch one esearch query; records whose PMID is already in seen_pmids are skipped.
 
-            if papers:
-                print(f"✅ Found {len(papers)} papers with ISSN: {issn}")
-                break  # stop if papers found
+    A batch that keeps failing ends the query, but papers from the batches before it are
+    still returned, and PMIDs only count as seen once their batch has been parsed.
+    """
+    try:
+        count, webenv, query_key = search or search_pubmed(query)
+    except Exception as e:
+        print(f"❗ Error for query {query[:80]}...: {e}")
+        return []
+    if count == 0:
+        return []
 
-            if len(issn) == 8:
-                formatted_issn = issn[:4] + '-' + issn[4:]
-                print(f"🔁 Trying formatted ISSN: {formatted_issn}")
-                papers = fetch_full_pubmed_papers(formatted_issn, keywords, start_year=2015)
+    all_papers = []
+    batch_size = 200
+
+    for start in range(0, min(count, PUBMED_MAX_RESULTS), batch_size):
+        records = fetch_batch(webenv, query_key, start, batch_size)
+        if records is None:
+            print(f"❗ Giving up on the rest of query {query[:80]}... after {len(all_papers)} papers")
+            break
+
+        for record in records:
+            pmid = record.get("PMID", "")
+            if not pmid or pmid in seen_pmids:
+                continue
+            seen_pmids.add(pmid)
+            authors = "; ".join(record.get("AU", []))
+            title = record.get("TI", "")
+            journal = record.get("JT", "")
+            pub_date = record.get("DP", "")
+            abstract = record.get("AB", "")
+            doi = next((aid[:-len(" [doi]")] for aid in record.get("AID", []) if aid.endswith(" [doi]")), "")
+            citation_count = fetch_citation_count(pmid)
+            pubmed_url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+
+            all_papers.append({
+                "PMID": pmid,
+                "DOI": doi,
+                "Title": title,
+                "Authors": authors,
+                "Journal": journal,
+                "Matched Journal": match_journal(record, journal_lookup),
+                "Publication Date": pub_date,
+                "Abstract": abstract,
+                "Citations Count": citation_count,
+                "PubMed URL": pubmed_url
+            })
+
+        sleep(1)
+
+    return all_papers
+
+
+def collect_papers(clauses, keywords, journal_lookup, seen_pmids, start_year=2015, end_year=None):
+    """Fetch a clause group, splitting it (journals first, then years) while it matches too many papers."""
+    query = build_query(clauses, keywords, start_year, end_year or 3000)
+    try:
+        search = search_pubmed(query)
+    except Exception as e:
+        print(f"❗ Error for query {query[:80]}...: {e}")
+        return []
 
-                if papers:
-                    print(f"✅ Found {len(papers)} papers with formatted ISSN: {formatted_issn}")
-                    break  # stop if papers found
+    if search[0] > PUBMED_MAX_RESULTS:
+        if len(clauses) > 1:
+            half = len(clauses) // 2
+            return (collect_papers(clauses[:half], keywords, journal_lookup, seen_pmids, start_year, end_year) +
+                    collect_papers(clauses[half:], keywords, journal_lookup, seen_pmids, start_year, end_year))
+        last_year = end_year or datetime.now().year
+        if last_year > start_year:
+            middle = (start_year + last_year) // 2
+            return (collect_papers(clauses, keywords, journal_lookup, seen_pmids, start_year, middle) +
+                    collect_papers(clauses, keywords, journal_lookup, seen_pmids, middle + 1, end_year))
+        print(f"⚠️ {search[0]} hits for one journal in {start_year}; only the first {PUBMED_MAX_RESULTS} are fetched")
+
+    return fetch_full_pubmed_papers(query, journal_lookup, seen_pmids, search)
+
+# Pack every journal (abbreviation + all ISSN forms) into a few large queries
+journals, journal_lookup = build_journal_terms(journal_info)
+groups = plan_queries(journals, keywords, start_year=2015)
+print(f"🔍 {len(journals)} journals packed into {len(groups)} queries")
 
-    if papers:
-        print(f"✅ Final success — {len(papers)} papers added.")
-    else:
-        print(f"❌ No papers found for {abbrev} / {raw_issns}")
+all_results = []
+seen_pmids = set()
 
+for clauses in tqdm(groups, desc="Fetching Full Metadata from PubMed"):
+    papers = collect_papers(clauses, keywords, journal_lookup, seen_pmids, start_year=2015)
+    print(f"✅ {len(papers)} new papers from this batch")
     all_results.extend(papers)
     sleep(1)
 